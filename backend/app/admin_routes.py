@@ -1,16 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from datetime import date as dt_date
 from app.database import SessionLocal
 from app.models import Master, Academics, Attendance
 from app.admin_auth import admin_auth
-from sqlalchemy import extract
-import pandas as pd
-from fastapi.responses import FileResponse
+from app.services import invalidate_student, invalidate_students
+from app.stats import rollup_counts
+from app import rollup
+from app.time_parser import month_window, window_criteria, inclusive_window
+from app.database import run_db
+from app.llm_scheduler import scheduler as llm_scheduler
+from app.llm import pool as llm_pool
+from app import prompts, profiling
+from app.bulk_import import read_bulk_payload, import_attendance, import_marks
+from app.schemas import BulkImportResult
+from app.attendance_export import (
+    has_attendance,
+    stream_csv,
+    write_xlsx,
+    XLSX_MEDIA_TYPE,
+)
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Literal, Optional
 import os
-from fastapi.responses import StreamingResponse
-from io import BytesIO
-from sqlalchemy import cast, String
 
 router = APIRouter(prefix="/admin", tags=["Admin Panel"])
 
@@ -52,6 +65,7 @@ def add_student(student_id: int, name: str, db: Session = Depends(get_db)):
     student = Master(id=student_id, name=name)
     db.add(student)
     db.commit()
+    invalidate_student(student_id)
 
     return {"message": "Student added successfully"}
 
@@ -100,6 +114,7 @@ def add_or_update_marks(
     if record:
         record.score = score
         db.commit()
+        invalidate_student(student_id)
         return {"message": f"Marks updated for {record.subject}"}
 
     db.add(
@@ -110,10 +125,29 @@ def add_or_update_marks(
         )
     )
     db.commit()
+    invalidate_student(student_id)
 
     return {"message": f"Marks added for {subject}"}
 
 
+def _import_and_invalidate(importer, db, rows):
+    # On the DB thread, so the reply cache's disk deletes stay off the event loop
+    result, student_ids = importer(db, rows)
+    invalidate_students(student_ids)
+    return result
+
+
+# Bulk Marks (JSON array, CSV or XLSX with student_id, subject, score)
+@router.post(
+    "/marks/bulk",
+    dependencies=[Depends(admin_auth)],
+    response_model=BulkImportResult
+)
+async def bulk_marks(request: Request, db: Session = Depends(get_db)):
+    rows = await read_bulk_payload(request)
+    return await run_db(_import_and_invalidate, import_marks, db, rows)
+
+
 # ---------------- DELETE ----------------
 
 # Delete Student + All Related Records
@@ -135,9 +169,11 @@ def delete_student(student_id: int, db: Session = Depends(get_db)):
     db.query(Attendance).filter(
         Attendance.student_id == student_id
     ).delete()
+    rollup.forget_student(db, student_id)
 
     db.delete(student)
     db.commit()
+    invalidate_student(student_id)
 
     return {"message": "Student and all related records deleted"}
 
@@ -210,8 +246,10 @@ def add_or_update_attendance(
     ).first()
 
     if record:
+        rollup.record_attendance(db, student_id, att_date, record.status, status)
         record.status = status
         db.commit()
+        invalidate_student(student_id)
         return {"message": f"Attendance updated for {att_date}"}
 
     db.add(
@@ -221,40 +259,41 @@ def add_or_update_attendance(
             status=status
         )
     )
+    rollup.record_attendance(db, student_id, att_date, None, status)
     db.commit()
+    invalidate_student(student_id)
 
     return {"message": f"Attendance added for {att_date}"}
 
 
+# Bulk Attendance (JSON array, CSV or XLSX with student_id, date, status)
+@router.post(
+    "/attendance/bulk",
+    dependencies=[Depends(admin_auth)],
+    response_model=BulkImportResult
+)
+async def bulk_attendance(request: Request, db: Session = Depends(get_db)):
+    rows = await read_bulk_payload(request)
+    return await run_db(_import_and_invalidate, import_attendance, db, rows)
+
+
 #-------------Attendance summary-------
 @router.get("/attendance/summary/{student_id}", dependencies=[Depends(admin_auth)])
 def attendance_summary(student_id: int, db: Session = Depends(get_db)):
     sid = int(student_id)
 
-    records = db.query(Attendance).filter(
-        Attendance.student_id == sid
-    ).all()
+    total, present, absent = rollup_counts(db, sid)
 
-    if not records:
+    if not total:
         raise HTTPException(
             status_code=404,
             detail="No attendance data found"
         )
 
-    present = sum(
-        1 for r in records
-        if r.status and r.status.strip().lower() == "present"
-    )
-
-    absent = sum(
-        1 for r in records
-        if r.status and r.status.strip().lower() == "absent"
-    )
-
-    percentage = round((present / len(records)) * 100, 2)
+    percentage = round((present / total) * 100, 2)
 
     return {
-        "total": len(records),
+        "total": total,
         "present": present,
         "absent": absent,
         "percentage": percentage
@@ -269,12 +308,16 @@ def attendance_month(
     month: int,
     db: Session = Depends(get_db)
 ):
-    month_str = f"{year}-{str(month).zfill(2)}"
+    if not 1 <= month <= 12:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid month. Use 1-12"
+        )
 
-    records = db.query(Attendance).filter(
+    records = db.query(Attendance.date, Attendance.status).filter(
         Attendance.student_id == int(student_id),
-        cast(Attendance.date, String).like(f"{month_str}%")
-    ).all()
+        *window_criteria(Attendance.date, month_window(year, month))
+    ).order_by(Attendance.date).all()
 
     if not records:
         raise HTTPException(
@@ -291,50 +334,173 @@ def attendance_month(
     ]
 
 
-#--------Export to excel
+#--------Export (CSV streamed, XLSX write-only)
+def _export_response(db, student_ids, window, register, fmt, filename):
+    if fmt == "csv":
+        return StreamingResponse(
+            stream_csv(student_ids, window, register),
+            media_type="text/csv",
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}.csv"
+            }
+        )
+
+    path = write_xlsx(db, student_ids, window, register)
+
+    return FileResponse(
+        path,
+        media_type=XLSX_MEDIA_TYPE,
+        filename=f"{filename}.xlsx",
+        background=BackgroundTask(os.remove, path)
+    )
+
+
+# Whole register: every student, or the ids given in student_ids=1,2,3
+@router.get(
+    "/attendance/export",
+    dependencies=[Depends(admin_auth)]
+)
+def export_register(
+    student_ids: Optional[str] = None,
+    start: Optional[dt_date] = None,
+    end: Optional[dt_date] = None,
+    format: Literal["xlsx", "csv"] = "xlsx",
+    db: Session = Depends(get_db)
+):
+    try:
+        ids = [int(i) for i in student_ids.split(",") if i.strip()] if student_ids else None
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="student_ids must be a comma-separated list of integers"
+        )
+
+    window = inclusive_window(start, end)
+
+    if not has_attendance(db, ids, window):
+        raise HTTPException(
+            status_code=404,
+            detail="No attendance data to export"
+        )
+
+    return _export_response(db, ids, window, True, format, "attendance_register")
+
+
 @router.get(
     "/attendance/export/{student_id}",
     dependencies=[Depends(admin_auth)]
 )
 def export_attendance(
     student_id: int,
+    start: Optional[dt_date] = None,
+    end: Optional[dt_date] = None,
+    format: Literal["xlsx", "csv"] = "xlsx",
     db: Session = Depends(get_db)
 ):
-    records = db.query(Attendance).filter(
-        Attendance.student_id == student_id
-    ).all()
+    window = inclusive_window(start, end)
 
-    if not records:
+    if not has_attendance(db, [student_id], window):
         raise HTTPException(
             status_code=404,
             detail="No attendance data to export"
         )
 
-    data = [
-        {
-            "Date": r.date.isoformat(),
-            "Status": r.status
-        }
-        for r in records
-    ]
+    return _export_response(
+        db, [student_id], window, False, format, f"attendance_{student_id}"
+    )
+
 
-    df = pd.DataFrame(data)
+# ---------------- LLM SCHEDULER ----------------
+@router.get("/llm/stats", dependencies=[Depends(admin_auth)])
+def llm_stats():
+    """In-flight and queued generations, sheds, queue wait and generation times per intent."""
+    return {
+        **llm_scheduler.stats(),
+        "backends": llm_pool.stats(),
+        "prompts": prompts.stats(),
+    }
 
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Attendance")
 
-    output.seek(0)
+# ---------------- PROFILING ----------------
+def _profile_session():
+    if profiling.session is None:
+        raise HTTPException(status_code=404, detail="No profiling session yet")
+    return profiling.session
 
-    return StreamingResponse(
-        output,
-        media_type=(
-            "application/vnd.openxmlformats-officedocument."
-            "spreadsheetml.sheet"
-        ),
-        headers={
-            "Content-Disposition": (
-                f"attachment; filename=attendance_{student_id}.xlsx"
-            )
-        }
+
+def _profile_groups(endpoint: Optional[str], intent: Optional[str]):
+    groups = _profile_session().select(endpoint, intent)
+    if not groups:
+        raise HTTPException(status_code=404, detail="No profiled requests match")
+    return groups
+
+
+@router.post("/profile/start", dependencies=[Depends(admin_auth)])
+async def start_profile(
+    mode: Literal["cprofile", "sample"] = "sample",
+    requests: Optional[int] = None,
+    percent: Optional[float] = None,
+    path_prefix: str = "/chat",
+):
+    """
+    Profile the next `requests` requests, or `percent` % of traffic until
+    stopped, whose path starts with `path_prefix`. Replaces earlier results.
+    """
+    if requests is None and percent is None:
+        raise HTTPException(status_code=400, detail="Give requests or percent")
+    if requests is not None and requests < 1:
+        raise HTTPException(status_code=400, detail="requests must be at least 1")
+    if percent is not None and not 0 < percent <= 100:
+        raise HTTPException(status_code=400, detail="percent must be in (0, 100]")
+
+    return profiling.start(mode, requests, percent, path_prefix).state()
+
+
+@router.post("/profile/stop", dependencies=[Depends(admin_auth)])
+def stop_profile():
+    session = _profile_session()
+    session.stop()
+    return session.state()
+
+
+@router.get("/profile", dependencies=[Depends(admin_auth)])
+def profile_status():
+    """Session settings and per endpoint/intent request counts, mean time and samples."""
+    return _profile_session().state()
+
+
+@router.get("/profile/pstats", dependencies=[Depends(admin_auth)])
+def profile_pstats(endpoint: Optional[str] = None, intent: Optional[str] = None):
+    """cprofile sessions: merged stats, loadable with pstats.Stats(path) or snakeviz."""
+    data = profiling.pstats_dump(_profile_groups(endpoint, intent))
+    if data is None:
+        raise HTTPException(status_code=404, detail="No cProfile data (sample session?)")
+    return Response(
+        content=data,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": 'attachment; filename="profile.pstats"'},
+    )
+
+
+@router.get("/profile/top", dependencies=[Depends(admin_auth)])
+def profile_top(
+    endpoint: Optional[str] = None,
+    intent: Optional[str] = None,
+    sort: Literal["cumulative", "tottime", "ncalls"] = "cumulative",
+    limit: int = 40,
+):
+    """cprofile sessions: the top functions as pstats prints them."""
+    report = profiling.pstats_text(_profile_groups(endpoint, intent), limit, sort)
+    if report is None:
+        raise HTTPException(status_code=404, detail="No cProfile data (sample session?)")
+    return PlainTextResponse(report)
+
+
+@router.get("/profile/collapsed", dependencies=[Depends(admin_auth)])
+def profile_collapsed(endpoint: Optional[str] = None, intent: Optional[str] = None):
+    """sample sessions: collapsed stacks for flamegraph.pl or speedscope."""
+    groups = _profile_groups(endpoint, intent)
+    return PlainTextResponse(
+        profiling.collapsed(groups, prefix_with_group=len(groups) > 1),
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'},
     )
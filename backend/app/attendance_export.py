@@ -0,0 +1,121 @@
+import csv
+import io
+import os
+import tempfile
+
+from openpyxl import Workbook
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Master, Attendance
+from app.time_parser import window_criteria
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+XLSX_MEDIA_TYPE = (
+    "application/vnd.openxmlformats-officedocument."
+    "spreadsheetml.sheet"
+)
+
+STUDENT_COLUMNS = ["Date", "Status"]
+REGISTER_COLUMNS = ["Student ID", "Name", "Date", "Status"]
+
+
+# =====================================================
+# 📤 ROW SOURCE
+# =====================================================
+
+def _criteria(student_ids, window):
+    criteria = list(window_criteria(Attendance.date, window))
+    if student_ids:
+        criteria.append(Attendance.student_id.in_(student_ids))
+    return criteria
+
+
+def has_attendance(db: Session, student_ids=None, window=None):
+    return db.query(Attendance.id).filter(
+        *_criteria(student_ids, window)
+    ).first() is not None
+
+
+def iter_attendance(db: Session, student_ids=None, window=None, register=True):
+    """
+    Yield export rows in (student, date) order from a server-side cursor,
+    EXPORT_BATCH_SIZE rows at a time, without building ORM objects.
+    """
+    if register:
+        query = db.query(
+            Attendance.student_id, Master.name, Attendance.date, Attendance.status
+        ).join(Master, Master.id == Attendance.student_id)
+    else:
+        query = db.query(Attendance.date, Attendance.status)
+
+    query = query.filter(
+        *_criteria(student_ids, window)
+    ).order_by(
+        Attendance.student_id, Attendance.date
+    ).execution_options(
+        stream_results=True, yield_per=EXPORT_BATCH_SIZE
+    )
+
+    for row in query:
+        yield [
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in row
+        ]
+
+
+# =====================================================
+# 🧾 CSV (streamed row by row)
+# =====================================================
+
+def stream_csv(student_ids=None, window=None, register=True):
+    """Generator for StreamingResponse; owns its session for the whole stream."""
+    db = SessionLocal()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    try:
+        writer.writerow(REGISTER_COLUMNS if register else STUDENT_COLUMNS)
+
+        for count, row in enumerate(iter_attendance(db, student_ids, window, register), 1):
+            writer.writerow(row)
+
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+# =====================================================
+# 📊 XLSX (write-only workbook, constant memory)
+# =====================================================
+
+def write_xlsx(db: Session, student_ids=None, window=None, register=True):
+    """
+    Write the export to a temporary .xlsx file and return its path.
+    openpyxl's write-only mode spools rows to disk as they are appended,
+    so memory stays flat however many rows are exported.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Attendance")
+    sheet.append(REGISTER_COLUMNS if register else STUDENT_COLUMNS)
+
+    for row in iter_attendance(db, student_ids, window, register):
+        sheet.append(row)
+
+    fd, path = tempfile.mkstemp(prefix="attendance-", suffix=".xlsx")
+    os.close(fd)
+
+    try:
+        workbook.save(path)
+    except Exception:
+        os.remove(path)
+        raise
+
+    return path
@@ -0,0 +1,267 @@
+import csv
+import io
+import json
+import os
+
+from fastapi import HTTPException, Request
+from openpyxl import load_workbook
+from pydantic import ValidationError
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import Master, Academics, Attendance
+from app.schemas import AttendanceRow, MarksRow
+from app import rollup
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+
+ATTENDANCE_STATUSES = {"present": "Present", "absent": "Absent"}
+
+
+# =====================================================
+# 📥 PAYLOAD PARSING (JSON / CSV / XLSX)
+# =====================================================
+
+def _csv_rows(data: bytes):
+    text = data.decode("utf-8-sig")
+    return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+
+
+def _xlsx_rows(data: bytes):
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, [])]
+        return [
+            dict(zip(header, values))
+            for values in rows
+            if any(v is not None for v in values)
+        ]
+    finally:
+        workbook.close()
+
+
+async def read_bulk_payload(request: Request):
+    """Rows from a JSON array, a CSV body, or a CSV/XLSX multipart upload."""
+    content_type = request.headers.get("content-type", "")
+
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="Upload a file in the 'file' field")
+
+            data = await upload.read()
+            if (upload.filename or "").lower().endswith(".xlsx"):
+                return _xlsx_rows(data)
+            return _csv_rows(data)
+
+        if content_type.startswith("text/csv"):
+            return _csv_rows(await request.body())
+
+        payload = json.loads(await request.body())
+
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(status_code=400, detail="Could not parse uploaded data")
+
+    if isinstance(payload, dict):
+        payload = payload.get("rows")
+
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of rows")
+
+    return payload
+
+
+# =====================================================
+# ✅ VALIDATION
+# =====================================================
+
+def _validate(rows, schema):
+    valid, errors = [], []
+
+    for position, raw in enumerate(rows, start=1):
+        if not isinstance(raw, dict):
+            errors.append({"row": position, "error": "Row must be an object"})
+            continue
+
+        cleaned = {
+            str(k).strip().lower(): (v.strip() if isinstance(v, str) else v)
+            for k, v in raw.items() if k is not None
+        }
+        try:
+            valid.append((position, schema.model_validate(cleaned)))
+        except ValidationError as e:
+            first = e.errors()[0]
+            field = ".".join(str(p) for p in first["loc"])
+            errors.append({"row": position, "error": f"{field}: {first['msg']}"})
+
+    return valid, errors
+
+
+def _drop_unknown_students(db: Session, valid, errors):
+    ids = {row.student_id for _, row in valid}
+    known = {
+        sid for (sid,) in
+        db.query(Master.id).filter(Master.id.in_(ids)).all()
+    } if ids else set()
+
+    kept = []
+    for position, row in valid:
+        if row.student_id in known:
+            kept.append((position, row))
+        else:
+            errors.append({"row": position, "error": "Student not found"})
+    return kept
+
+
+# =====================================================
+# 💾 UPSERTS
+# =====================================================
+
+def _upsert(db: Session, model, values, keys, updates):
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        stmt = sqlite.insert(model).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={c: stmt.excluded[c] for c in updates}
+        )
+    elif dialect == "postgresql":
+        stmt = postgresql.insert(model).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={c: stmt.excluded[c] for c in updates}
+        )
+    elif dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(model).values(values)
+        stmt = stmt.on_duplicate_key_update(
+            {c: stmt.inserted[c] for c in updates}
+        )
+    else:
+        raise RuntimeError(f"Bulk upsert is not supported for {dialect}")
+
+    db.execute(stmt)
+
+
+def _write_chunks(db: Session, model, items, keys, updates, errors, before_write=None):
+    """
+    items: [(position, values)]. Each chunk is one transaction; a failing
+    chunk is retried row by row so one bad row doesn't sink its neighbours.
+    before_write(db, values_list) runs first in the same transaction.
+    """
+    def write(values_list):
+        if before_write is not None:
+            before_write(db, values_list)
+        _upsert(db, model, values_list, keys, updates)
+
+    written = []
+
+    for i in range(0, len(items), BULK_CHUNK_SIZE):
+        chunk = items[i:i + BULK_CHUNK_SIZE]
+        try:
+            write([v for _, v in chunk])
+            db.commit()
+            written.extend(chunk)
+            continue
+        except Exception:
+            db.rollback()
+
+        for position, values in chunk:
+            try:
+                write([values])
+                db.commit()
+                written.append((position, values))
+            except Exception as e:
+                db.rollback()
+                errors.append({"row": position, "error": str(e.__cause__ or e)})
+
+    return written
+
+
+def _dedupe(items, key, errors):
+    # Last occurrence of a key wins, as it would with one call per row;
+    # the rows it replaces are reported, so every row is accounted for
+    latest = {}
+    for position, values in items:
+        latest[key(values)] = (position, values)
+
+    for position, values in items:
+        winner = latest[key(values)][0]
+        if winner != position:
+            errors.append({"row": position, "error": f"duplicate of row {winner}"})
+
+    return sorted(latest.values(), key=lambda item: item[0])
+
+
+def import_attendance(db: Session, rows):
+    valid, errors = _validate(rows, AttendanceRow)
+
+    checked = []
+    for position, row in valid:
+        status = ATTENDANCE_STATUSES.get(row.status.lower())
+        if status is None:
+            errors.append({"row": position, "error": "status: must be Present or Absent"})
+        else:
+            checked.append((position, row.model_copy(update={"status": status})))
+
+    checked = _drop_unknown_students(db, checked, errors)
+
+    items = _dedupe(
+        [(p, r.model_dump()) for p, r in checked],
+        key=lambda v: (v["student_id"], v["date"]),
+        errors=errors
+    )
+    written = _write_chunks(
+        db, Attendance, items,
+        keys=["student_id", "date"], updates=["status"], errors=errors,
+        before_write=rollup.record_bulk
+    )
+
+    return _result(rows, written, errors)
+
+
+def import_marks(db: Session, rows):
+    valid, errors = _validate(rows, MarksRow)
+    valid = _drop_unknown_students(db, valid, errors)
+
+    # Reuse the stored spelling of a subject, matching /admin/marks' ilike lookup
+    ids = {row.student_id for _, row in valid}
+    existing = {
+        (sid, subject.lower()): subject
+        for sid, subject in db.query(Academics.student_id, Academics.subject)
+        .filter(Academics.student_id.in_(ids)).all()
+    } if ids else {}
+
+    items = []
+    for position, row in valid:
+        values = row.model_dump()
+        values["subject"] = existing.get(
+            (row.student_id, row.subject.lower()), row.subject
+        )
+        items.append((position, values))
+
+    items = _dedupe(
+        items,
+        key=lambda v: (v["student_id"], v["subject"].lower()),
+        errors=errors
+    )
+    written = _write_chunks(
+        db, Academics, items,
+        keys=["student_id", "subject"], updates=["score"], errors=errors
+    )
+
+    return _result(rows, written, errors)
+
+
+def _result(rows, written, errors):
+    """(response body, ids of students whose data changed)."""
+    return {
+        "received": len(rows),
+        "written": len(written),
+        "errors": sorted(errors, key=lambda e: e["row"]),
+    }, {v["student_id"] for _, v in written}
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app.database import SessionLocal, run_db
+from app.models import ChatHistory
+from app import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# 📝 CHAT-LOG WRITER
+# Chat turns are queued in memory and inserted in batches by a
+# background thread, so the reply never waits on a commit.
+# =====================================================
+
+CHAT_LOG_QUEUE_SIZE = int(os.getenv("CHAT_LOG_QUEUE_SIZE", "10000"))
+CHAT_LOG_BATCH_SIZE = int(os.getenv("CHAT_LOG_BATCH_SIZE", "200"))
+CHAT_LOG_FLUSH_INTERVAL = float(os.getenv("CHAT_LOG_FLUSH_INTERVAL", "0.5"))  # seconds
+
+# "async": reply immediately (fire-and-forget)
+# "flush": reply once the row's batch has been committed
+CHAT_LOG_DURABILITY = os.getenv("CHAT_LOG_DURABILITY", "async").lower()
+
+_STOP = object()
+
+
+class ChatLogWriter:
+    def __init__(self, maxsize, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="chat-log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        """Flush everything queued so far, then stop the worker."""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, row) -> Future:
+        """Queue a row; raises queue.Full when the writer can't keep up."""
+        future = Future()
+        self._queue.put_nowait((row, future))
+        return future
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        stopping = False
+
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+
+    def _write(self, batch):
+        db = SessionLocal()
+        started = time.perf_counter()
+        try:
+            db.execute(insert(ChatHistory), [row for row, _ in batch])
+            db.commit()
+            metrics.observe(metrics.CHAT_LOG_BATCH_SECONDS, time.perf_counter() - started)
+        except Exception as e:
+            db.rollback()
+            logger.exception("chat log batch write failed")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        for _, future in batch:
+            future.set_result(None)
+
+
+writer = ChatLogWriter(
+    CHAT_LOG_QUEUE_SIZE, CHAT_LOG_BATCH_SIZE, CHAT_LOG_FLUSH_INTERVAL
+)
+
+
+def _write_now(row):
+    db = SessionLocal()
+    try:
+        db.execute(insert(ChatHistory), [row])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def record_chat(role, message, reply, student_id=None):
+    row = {
+        "role": role,
+        "user_message": message,
+        "bot_reply": reply,
+        "student_id": student_id,
+        "timestamp": datetime.utcnow(),
+    }
+    started = time.perf_counter()
+    with tracing.span("save_chat") as span:
+        mode = await _save(row)
+        if span is not None:
+            span.attrs["mode"] = mode
+    metrics.observe(metrics.CHAT_SAVE_SECONDS, time.perf_counter() - started, mode=mode)
+
+
+async def _save(row):
+    """Hand the row over; returns how it was saved (the metrics label)."""
+    # Writer not running (scripts) or saturated: write inline, as before
+    if not writer.running:
+        await run_db(_write_now, row)
+        return "inline"
+
+    try:
+        future = writer.submit(row)
+    except queue.Full:
+        await run_db(_write_now, row)
+        return "inline"
+
+    if CHAT_LOG_DURABILITY == "flush":
+        await asyncio.wrap_future(future)
+    return CHAT_LOG_DURABILITY
@@ -1,19 +1,121 @@
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import contextvars
 import os
 
+from app import profiling, tracing
+
 # Load .env before reading DATABASE_URL
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+# Optional read replica for the read-only chat queries; defaults to the primary
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+
+
+# =====================================================
+# ⚙️ ENGINE SETTINGS
+# Server databases (Postgres/MySQL) get a sized, pre-pinged pool.
+# SQLite gets WAL so chat reads don't block admin writes, and a
+# busy timeout so concurrent writers wait instead of failing.
+# =====================================================
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))     # seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))     # seconds; below server idle timeouts
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # safe with WAL
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes
+
+
+def _sqlite_pragmas(in_memory):
+    def on_connect(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        if not in_memory:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+    return on_connect
+
+
+def make_engine(url):
+    url = make_url(url)
+
+    if url.get_backend_name() == "sqlite":
+        in_memory = url.database in (None, "", ":memory:")
+
+        options = {
+            "connect_args": {
+                # Sessions are handed to the run_db thread pool
+                "check_same_thread": False,
+                "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            }
+        }
+        if in_memory:
+            # Every connection would otherwise get its own empty database
+            options["poolclass"] = StaticPool
+        else:
+            options.update(
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+            )
+
+        sqlite_engine = create_engine(url, **options)
+        event.listen(sqlite_engine, "connect", _sqlite_pragmas(in_memory))
+        return sqlite_engine
+
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+engine = make_engine(DATABASE_URL)
+
+read_engine = make_engine(DATABASE_READ_URL) if DATABASE_READ_URL else engine
 
 SessionLocal = sessionmaker(bind=engine)
 
+# Only for queries that never write; may lag the primary when a replica is set
+ReadSessionLocal = sessionmaker(bind=read_engine)
+
 Base = declarative_base()
 
+
+# Bounded pool for blocking DB work issued from async endpoints.
+# Kept separate from the LLM path so SQL-only requests never queue behind it.
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+
+db_executor = ThreadPoolExecutor(
+    max_workers=DB_EXECUTOR_WORKERS,
+    thread_name_prefix="db"
+)
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    with tracing.span("db", fn=getattr(fn, "__name__", repr(fn))):
+        # The worker thread runs in a copy of this context, so its SQL
+        # spans land in the request's trace under this span (and a
+        # profiled request keeps profiling there)
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            db_executor, partial(ctx.run, profiling.run_in_worker, fn, *args, **kwargs)
+        )
@@ -73,92 +73,88 @@ def filter_input(message: str):
 
 
 # Function to filter output messages(FILTER 2)
-def apply_tone(role: str, text: str, reason: str = "OK"):
-    # Safety fallback
-    if not text:
-        text = "We are unable to process your request at the moment."
+EMPTY_REPLY_FALLBACK = "We are unable to process your request at the moment."
 
+
+def tone_frame(role: str, reason: str = "OK"):
+    """Return the (prefix, suffix) that apply_tone wraps around a reply."""
     role = role.lower()
 
     # Unknown role fallback (extra safety)
     if role not in ["student", "parent"]:
-        return (
-            f"{text}\n\n"
-            "— School Support Team"
-        )
+        return "", "\n\n— School Support Team"
 
     # Student tone
     if role == "student":
         if reason == "ABUSE":
             return (
-                "😊 Hi!\n\n"
-                f"{text}\n\n"
-                "Let's treat everyone kindly and focus on learning!"
+                "😊 Hi!\n\n",
+                "\n\nLet's treat everyone kindly and focus on learning!"
             )
         if reason == "VIOLENCE":
             return (
-                "🚨 Hi!\n\n"
-                f"{text}\n\n"
-                "If you're feeling unsafe, please reach out to a teacher or counselor right away."
+                "🚨 Hi!\n\n",
+                "\n\nIf you're feeling unsafe, please reach out to a teacher or counselor right away."
             )
         if reason == "ILLEGAL":
             return (
-                "😊 Hi!\n\n"
-                f"{text}\n\n"
-                "It's always best to follow school rules and stay safe."
+                "😊 Hi!\n\n",
+                "\n\nIt's always best to follow school rules and stay safe."
             )
         if reason == "SYSTEM":
             return (
-                "😊 Hi!\n\n"
-                f"{text}\n\n"
-                "For privacy and security, some actions are restricted."
+                "😊 Hi!\n\n",
+                "\n\nFor privacy and security, some actions are restricted."
             )
         return (
-            "😊 Hi!\n\n"
-            f"{text}\n\n"
-            "Keep learning and doing great!"
+            "😊 Hi!\n\n",
+            "\n\nKeep learning and doing great!"
         )
 
     # Parent tone
     if reason == "ABUSE":
         return (
-            "Dear Parent,\n\n"
-            f"{text}\n\n"
-            "We encourage respectful communication at all times.\n\n"
+            "Dear Parent,\n\n",
+            "\n\nWe encourage respectful communication at all times.\n\n"
             "Regards,\n"
             "School Administration"
         )
 
     if reason == "VIOLENCE":
         return (
-            "Dear Parent,\n\n"
-            f"{text}\n\n"
-            "For any safety-related concerns, please contact the school office immediately.\n\n"
+            "Dear Parent,\n\n",
+            "\n\nFor any safety-related concerns, please contact the school office immediately.\n\n"
             "Regards,\n"
             "School Administration"
         )
 
     if reason == "ILLEGAL":
         return (
-            "Dear Parent,\n\n"
-            f"{text}\n\n"
-            "The school follows strict legal and ethical guidelines.\n\n"
+            "Dear Parent,\n\n",
+            "\n\nThe school follows strict legal and ethical guidelines.\n\n"
             "Regards,\n"
             "School Administration"
         )
 
     if reason == "SYSTEM":
         return (
-            "Dear Parent,\n\n"
-            f"{text}\n\n"
-            "This request involves restricted system-level information.\n\n"
+            "Dear Parent,\n\n",
+            "\n\nThis request involves restricted system-level information.\n\n"
             "Regards,\n"
             "School Administration"
         )
 
     return (
-        "Dear Parent,\n\n"
-        f"{text}\n\n"
-        "Regards,\n"
+        "Dear Parent,\n\n",
+        "\n\nRegards,\n"
         "School Administration"
     )
+
+
+def apply_tone(role: str, text: str, reason: str = "OK"):
+    # Safety fallback
+    if not text:
+        text = EMPTY_REPLY_FALLBACK
+
+    prefix, suffix = tone_frame(role, reason)
+    return f"{prefix}{text}{suffix}"
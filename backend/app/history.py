@@ -0,0 +1,96 @@
+import base64
+from datetime import datetime, time
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.models import ChatHistory, ReplyTemplate
+from app.time_parser import inclusive_window
+
+# =====================================================
+# 🕘 CHAT HISTORY PAGES
+# Newest first, keyset-paginated on (timestamp, id): each page
+# seeks straight to the cursor in ix_chat_history_student_timestamp_id,
+# so page 50 costs the same as page 1. Only the columns the client
+# renders are selected.
+# =====================================================
+
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+
+def bot_reply_column():
+    """The stored reply, or its template once compacted (needs the outer join)."""
+    return func.coalesce(ReplyTemplate.text, ChatHistory.bot_reply)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+
+def fetch_history_page(
+    db: Session,
+    student_id: int,
+    cursor=None,
+    limit=HISTORY_PAGE_SIZE,
+    role=None,
+    start=None,
+    end=None,
+):
+    """(rows, next_cursor); rows are (id, role, user_message, bot_reply, timestamp)."""
+    query = db.query(
+        ChatHistory.id,
+        ChatHistory.role,
+        ChatHistory.user_message,
+        bot_reply_column().label("bot_reply"),
+        ChatHistory.timestamp,
+    ).outerjoin(
+        ReplyTemplate, ReplyTemplate.id == ChatHistory.reply_template_id
+    ).filter(ChatHistory.student_id == student_id)
+
+    if role:
+        query = query.filter(func.lower(ChatHistory.role) == role.strip().lower())
+
+    window = inclusive_window(start, end)
+    if window:
+        # DateTime column: compare against midnight of each (inclusive) day
+        query = query.filter(
+            ChatHistory.timestamp >= datetime.combine(window[0], time.min),
+            ChatHistory.timestamp < datetime.combine(window[1], time.min),
+        )
+
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(
+            ChatHistory.timestamp <= timestamp,
+            or_(
+                ChatHistory.timestamp < timestamp,
+                and_(ChatHistory.timestamp == timestamp, ChatHistory.id < row_id),
+            ),
+        )
+
+    # One extra row tells us whether there is another page
+    rows = query.order_by(
+        ChatHistory.timestamp.desc(), ChatHistory.id.desc()
+    ).limit(limit + 1).all()
+
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.timestamp, last.id)
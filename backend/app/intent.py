@@ -24,7 +24,9 @@ TIME_PATTERNS = {
     r"\bthis\s+week\b": "week",
     r"\blast\s+week\b": "last_week",
     r"\bthis\s+month\b": "month",
-    r"\blast\s+month\b": "last_month"
+    r"\blast\s+month\b": "last_month",
+    r"\bthis\s+year\b": "year",
+    r"\blast\s+year\b": "last_year"
 }
 
 # ---- EDUCATION DOMAIN PATTERNS ----
@@ -0,0 +1,160 @@
+import re
+from typing import FrozenSet, NamedTuple, Optional
+
+from app.filters import SYSTEM_WORDS, VIOLENCE_WORDS, ILLEGAL_WORDS, ABUSE_WORDS
+from app.attendance_intent import ATTENDANCE_PATTERNS
+from app.academic_intent import RAW_MARKS_PATTERNS
+from app.advisor_intent import ADVISOR_PATTERNS
+from app.intent import EDUCATION_PATTERNS
+from app import schemas, tracing
+
+# ----------------------------------------
+# KEYWORD TABLES (substring match, as before)
+# ----------------------------------------
+
+OTHER_STUDENT_WORDS = [
+    "student id", "student with id", "another student",
+    "other student", "friend", "friend's",
+    "classmate", "someone else"
+]
+
+WRITE_WORDS = [
+    "update", "delete", "change", "edit", "modify",
+    "remove", "erase", "correct", "alter"
+]
+
+AVERAGE_WORDS = ["average"]
+
+STRONG_WORDS = ["strongest", "strong", "best", "highest"]
+WEAK_WORDS = ["weakest", "weak", "worst", "lowest"]
+
+SUBJECT_PERFORMANCE_PATTERN = (
+    r"\b(how|did|am|is)\b.*\b(i|he|she|my\s+child|my\s+son|my\s+daughter)\b"
+    r".*\b(perform|performance|doing)\b.*\b(english|math|science|history)\b"
+)
+
+# ----------------------------------------
+# INTENTS (one per branch of /chat)
+# ----------------------------------------
+
+GUARD = "guard"
+OTHER_STUDENT = "other_student"
+WRITE_BLOCK = "write_block"
+AVERAGE = "average"
+ATTENDANCE = "attendance"
+PERFORMANCE = "performance"
+RAW_MARKS = "raw_marks"
+STRENGTH = "strength"
+ADVISOR = "advisor"
+OUT_OF_SCOPE = "out_of_scope"
+
+# Checked in this order, same as filter_input
+FILTER_REASONS = ["SYSTEM", "VIOLENCE", "ILLEGAL", "ABUSE"]
+
+
+def _words(words):
+    return [rf"\b{re.escape(w)}\b" for w in words]
+
+
+def _literals(words):
+    return [re.escape(w) for w in words]
+
+
+CATEGORY_PATTERNS = {
+    "system": _words(SYSTEM_WORDS),
+    "violence": _words(VIOLENCE_WORDS),
+    "illegal": _words(ILLEGAL_WORDS),
+    "abuse": _words(ABUSE_WORDS),
+    "other_student": _literals(OTHER_STUDENT_WORDS),
+    "write": _literals(WRITE_WORDS),
+    "average": _literals(AVERAGE_WORDS),
+    "attendance": ATTENDANCE_PATTERNS,
+    "performance": [SUBJECT_PERFORMANCE_PATTERN],
+    "raw_marks": RAW_MARKS_PATTERNS,
+    "strong": _literals(STRONG_WORDS),
+    "weak": _literals(WEAK_WORDS),
+    "advisor": ADVISOR_PATTERNS,
+    "education": EDUCATION_PATTERNS,
+}
+
+
+def _compile(categories):
+    # Every category becomes an optional lookahead anchored at the start of
+    # the text, so a single match() call reports all categories at once
+    # instead of one re.search per pattern.
+    parts = []
+    for name, patterns in categories.items():
+        alternation = "|".join(f"(?:{p})" for p in patterns)
+        parts.append(rf"(?:(?=[\s\S]*?(?P<{name}>{alternation})))?")
+    return re.compile("".join(parts))
+
+
+_MATCHER = _compile(CATEGORY_PATTERNS)
+
+
+class Route(NamedTuple):
+    intent: str
+    reason: str
+    matches: FrozenSet[str]
+
+
+def match_categories(msg: str) -> FrozenSet[str]:
+    found = _MATCHER.match(msg)
+    return frozenset(
+        name for name, value in found.groupdict().items()
+        if value is not None
+    )
+
+
+def route_message(msg: str, student_id: Optional[int] = None) -> Route:
+    """Pick the /chat branch for an already normalized message."""
+    matches = match_categories(msg)
+
+    for reason in FILTER_REASONS:
+        if reason.lower() in matches:
+            return Route(GUARD, reason, matches)
+
+    if "other_student" in matches:
+        return Route(OTHER_STUDENT, "OK", matches)
+
+    if "write" in matches:
+        return Route(WRITE_BLOCK, "OK", matches)
+
+    if student_id:
+        if "average" in matches:
+            return Route(AVERAGE, "OK", matches)
+        if "attendance" in matches:
+            return Route(ATTENDANCE, "OK", matches)
+        if "performance" in matches:
+            return Route(PERFORMANCE, "OK", matches)
+        if "raw_marks" in matches:
+            return Route(RAW_MARKS, "OK", matches)
+        if "strong" in matches or "weak" in matches:
+            return Route(STRENGTH, "OK", matches)
+        if "advisor" in matches:
+            return Route(ADVISOR, "OK", matches)
+
+    return Route(OUT_OF_SCOPE, "OK", matches)
+
+
+class RoutedMessage(NamedTuple):
+    msg: str        # normalized text; the branches read dates and subjects from it
+    route: Route
+
+
+def normalize_message(message: str) -> str:
+    msg = message.lower().strip().replace("analyse", "analyze")
+    if re.fullmatch(r"\d{4}", msg):
+        msg = f"attendance {msg}"
+    return msg
+
+
+async def route_chat(request: schemas.ChatRequest) -> RoutedMessage:
+    """
+    FastAPI dependency for the chat endpoints and their rate limit.
+    Dependencies are cached per request, so each message is routed once.
+    """
+    msg = normalize_message(request.message)
+    with tracing.span("route"):
+        route = route_message(msg, request.student_id)
+    return RoutedMessage(msg, route)
@@ -1,36 +1,284 @@
 import os
-import requests
+import json
+import logging
+import time
+import httpx
+
+logger = logging.getLogger(__name__)
 
 OLLAMA_URL = os.getenv("OLLAMA_URL")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "phi3")
 
-def call_llm(prompt, role):
-    system_prompt = (
-        "You are a smart academic advisor for a school. "
-        "Analyze student performance, attendance, and marks. "
-        "Give personalized, positive, and practical improvement suggestions."
-    )
+# Comma-separated Ollama hosts; falls back to the single OLLAMA_URL
+OLLAMA_URLS = [
+    url.strip()
+    for url in os.getenv("OLLAMA_URLS", OLLAMA_URL or "").split(",")
+    if url.strip()
+]
+
+# Seconds; generation on CPU-only hosts is slow, so the read timeout is generous
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "10"))  # per backend
+
+# How long Ollama keeps the model loaded after a request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "10m")
+
+# "least_outstanding" or "latency" (outstanding requests x smoothed latency)
+OLLAMA_BALANCE = os.getenv("OLLAMA_BALANCE", "latency").lower()
+
+# Passive health: eject a backend after N failures in a row, for N seconds
+OLLAMA_EJECT_AFTER = int(os.getenv("OLLAMA_EJECT_AFTER", "3"))
+OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", "30"))
+
+LATENCY_SMOOTHING = 0.2
+
+# Worth another backend: the request never reached the model
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+RETRYABLE_STATUS = {502, 503, 504}
+
+
+class _Retry(Exception):
+    pass
+
+
+class IncompleteStream(Exception):
+    """The backend failed after tokens were sent; what was sent is not the whole reply."""
+
+
+# =====================================================
+# 🖧 BACKEND POOL
+# =====================================================
+
+class Backend:
+    def __init__(self, url):
+        self.base = url.split("/api/")[0].rstrip("/")
+        self.generate_url = f"{self.base}/api/generate"
+        self.outstanding = 0
+        self.latency = None          # smoothed seconds per request
+        self.failures = 0            # in a row
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self._client = None
+
+    @property
+    def client(self):
+        # One connection pool per backend, created lazily inside the event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    OLLAMA_READ_TIMEOUT,
+                    connect=OLLAMA_CONNECT_TIMEOUT
+                ),
+                limits=httpx.Limits(
+                    max_connections=OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=OLLAMA_MAX_CONNECTIONS
+                )
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def ejected(self, now=None):
+        return self.ejected_until > (now or time.monotonic())
+
+    def eject(self, seconds=OLLAMA_EJECT_SECONDS):
+        self.ejected_until = time.monotonic() + seconds
+
+    def readmit(self):
+        self.ejected_until = 0.0
+        self.failures = 0
+
+    def record_success(self, seconds):
+        self.failures = 0
+        self.ejected_until = 0.0
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += LATENCY_SMOOTHING * (seconds - self.latency)
+
+    def record_failure(self):
+        self.errors += 1
+        self.failures += 1
+        if self.failures >= OLLAMA_EJECT_AFTER:
+            self.eject()
+            logger.warning("Ollama backend %s ejected after %s failures", self.base, self.failures)
+
+    def score(self):
+        if OLLAMA_BALANCE == "latency":
+            # Unmeasured backends score 0 so they get tried
+            return (self.outstanding + 1) * (self.latency or 0), self.outstanding
+        return self.outstanding, self.latency or 0
+
+    def state(self):
+        return {
+            "url": self.base,
+            "outstanding": self.outstanding,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "consecutive_failures": self.failures,
+            "ejected": self.ejected(),
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+class BackendPool:
+    def __init__(self, urls):
+        self.backends = [Backend(url) for url in urls]
+
+    def pick(self, exclude=()):
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+
+        now = time.monotonic()
+        healthy = [b for b in candidates if not b.ejected(now)]
+        if healthy:
+            return min(healthy, key=Backend.score)
+
+        # Everything is ejected: try the one that comes back soonest
+        return min(candidates, key=lambda b: b.ejected_until)
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.close()
 
-    payload = {
+    def stats(self):
+        return [b.state() for b in self.backends]
+
+
+pool = BackendPool(OLLAMA_URLS)
+
+
+async def close_client():
+    await pool.close()
+
+
+UNAVAILABLE_REPLY = "⚠️ AI service is currently unavailable."
+
+
+def keep_alive_value():
+    # Ollama takes seconds as a number or a duration string like "10m"
+    value = OLLAMA_KEEP_ALIVE.strip()
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+def build_payload(prompt, stream=False):
+    # Prompts come from app.prompts, which already adds the system prefix and role
+    return {
         "model": OLLAMA_MODEL,
-        "prompt": f"{system_prompt}\n\nUser ({role}): {prompt}",
-        "stream": False  # 🚨 THIS FIXES THE HANG
+        "prompt": prompt,
+        "stream": stream,
+        "keep_alive": keep_alive_value()
     }
 
-    try:
-        res = requests.post(
-            OLLAMA_URL,
-            json=payload,
-            
 
-        )
+def _backends():
+    """Backends to try in order: a fresh pick each time, never the same twice."""
+    tried = []
+    while True:
+        backend = pool.pick(exclude=tried)
+        if backend is None:
+            return
+        tried.append(backend)
+        yield backend
+
+
+async def call_llm(prompt, role):
+    payload = build_payload(prompt)
+    error = "no OLLAMA_URL configured"
+
+    for backend in _backends():
+        backend.outstanding += 1
+        backend.requests += 1
+        t0 = time.perf_counter()
+        try:
+            res = await backend.client.post(backend.generate_url, json=payload)
+            if res.status_code in RETRYABLE_STATUS:
+                raise _Retry(f"HTTP {res.status_code}")
+
+            res.raise_for_status()
+
+            data = res.json()
+            backend.record_success(time.perf_counter() - t0)
+            return data.get("response", "No response from AI")
+
+        except (_Retry, *RETRYABLE_ERRORS) as e:
+            backend.record_failure()
+            error = f"{backend.base}: {e!r}"
+            continue
+
+        except Exception as e:
+            backend.record_failure()
+            error = f"{backend.base}: {e}"
+            break
+
+        finally:
+            backend.outstanding -= 1
+
+    logger.error("Ollama request failed: %s", error)
+    return UNAVAILABLE_REPLY
+
+
+async def stream_llm(prompt, role):
+    """Yield response tokens as Ollama produces them (NDJSON stream)."""
+    payload = build_payload(prompt, stream=True)
+    error = "no OLLAMA_URL configured"
+    sent = False
+    done = False
+
+    for backend in _backends():
+        backend.outstanding += 1
+        backend.requests += 1
+        t0 = time.perf_counter()
+        try:
+            async with backend.client.stream("POST", backend.generate_url, json=payload) as res:
+                if res.status_code in RETRYABLE_STATUS:
+                    raise _Retry(f"HTTP {res.status_code}")
+
+                res.raise_for_status()
+
+                async for line in res.aiter_lines():
+                    if not line:
+                        continue
+
+                    chunk = json.loads(line)
+                    token = chunk.get("response", "")
+                    if token:
+                        sent = True
+                        yield token
+
+                    if chunk.get("done"):
+                        done = True
+                        break
+
+            if not done:
+                raise _Retry("stream ended before the done chunk")
+
+            backend.record_success(time.perf_counter() - t0)
+            return
+
+        except (_Retry, *RETRYABLE_ERRORS) as e:
+            backend.record_failure()
+            error = f"{backend.base}: {e!r}"
+            if not sent:
+                continue
+            break
 
-        res.raise_for_status()
+        except Exception as e:
+            backend.record_failure()
+            error = f"{backend.base}: {e}"
+            break
 
-        data = res.json()
-        return data.get("response", "No response from AI")
+        finally:
+            backend.outstanding -= 1
 
-    
-    except Exception as e:
-        print("OLLAMA ERROR:", str(e))
-        return "⚠️ AI service is currently unavailable."
+    logger.error("Ollama request failed: %s", error)
+    if sent:
+        # Callers must not cache or present the partial text as the answer
+        raise IncompleteStream(error)
+    yield UNAVAILABLE_REPLY
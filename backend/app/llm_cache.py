@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from app.cache import LRUCache
+from app.llm import OLLAMA_MODEL, UNAVAILABLE_REPLY
+from app.llm_scheduler import call_llm, stream_llm
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))  # seconds
+
+# Optional SQLite file so cached replies survive restarts
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+
+# Seconds between deletes of expired rows from the SQLite file
+LLM_CACHE_SWEEP_SECONDS = float(os.getenv("LLM_CACHE_SWEEP_SECONDS", "300"))
+
+_memory = LRUCache(maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL)
+
+
+# =====================================================
+# 🔑 KEYS
+# =====================================================
+
+def normalize_question(question: str) -> str:
+    q = question.lower().replace("analyse", "analyze")
+    q = re.sub(r"[^\w\s]", " ", q)
+    return " ".join(q.split())
+
+
+def fingerprint(data) -> str:
+    raw = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def make_key(role, question, data, model=OLLAMA_MODEL) -> str:
+    parts = [role.lower(), model, normalize_question(question), fingerprint(data)]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+# =====================================================
+# 💾 DISK BACKEND
+# Blocking sqlite3 calls; the async API below runs them in a thread.
+# =====================================================
+
+class _DiskCache:
+    def __init__(self, path, ttl):
+        self.ttl = ttl
+        self._swept = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, student_id INTEGER, "
+            "reply TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_llm_cache_student "
+            "ON llm_cache (student_id)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """(student_id, reply, seconds left) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT student_id, reply, created FROM llm_cache WHERE key = ?",
+                (key,)
+            ).fetchone()
+
+        if row is None:
+            return None
+        left = row[2] + self.ttl - time.time()
+        if left <= 0:
+            return None
+        return row[0], row[1], left
+
+    def set(self, key, reply, student_id):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                (key, student_id, reply, now)
+            )
+            # Expired rows are never served, so clearing them can wait
+            if now - self._swept >= LLM_CACHE_SWEEP_SECONDS:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,)
+                )
+                self._swept = now
+            self._conn.commit()
+
+    # Below SQLite's default bound-parameter limit
+    INVALIDATE_CHUNK = 500
+
+    def invalidate_students(self, student_ids):
+        ids = list(student_ids)
+        with self._lock:
+            for i in range(0, len(ids), self.INVALIDATE_CHUNK):
+                chunk = ids[i:i + self.INVALIDATE_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                self._conn.execute(
+                    f"DELETE FROM llm_cache WHERE student_id IN ({marks})", chunk
+                )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+_disk = _DiskCache(LLM_CACHE_PATH, LLM_CACHE_TTL) if LLM_CACHE_PATH else None
+
+
+# =====================================================
+# 📦 CACHE API
+# =====================================================
+
+async def get(key):
+    entry = _memory.get(key)
+    if entry is not None:
+        return entry[1]
+
+    if _disk is not None:
+        entry = await asyncio.to_thread(_disk.get, key)
+        if entry is not None:
+            student_id, reply, left = entry
+            # Expire when the disk row does, not a full TTL from now
+            _memory.set(key, (student_id, reply), ttl=left)
+            return reply
+
+    return None
+
+
+async def put(key, reply, student_id=None):
+    _memory.set(key, (student_id, reply))
+    if _disk is not None:
+        await asyncio.to_thread(_disk.set, key, reply, student_id)
+
+
+def invalidate_students(student_ids):
+    """Blocking with LLM_CACHE_PATH set; call from a worker thread."""
+    student_ids = set(student_ids)
+    if not student_ids:
+        return
+    _memory.remove_where(lambda entry: entry[0] in student_ids)
+    if _disk is not None:
+        _disk.invalidate_students(student_ids)
+
+
+def invalidate_student(student_id):
+    invalidate_students([student_id])
+
+
+def clear():
+    _memory.clear()
+    if _disk is not None:
+        _disk.clear()
+
+
+# =====================================================
+# 🤖 CACHED LLM CALLS
+# =====================================================
+
+async def cached_call_llm(prompt, role, key, student_id=None, intent=None):
+    reply = await get(key)
+    if reply is not None:
+        return reply
+
+    reply = await call_llm(prompt, role, intent)
+    if reply != UNAVAILABLE_REPLY:
+        await put(key, reply, student_id)
+    return reply
+
+
+async def cached_stream_llm(prompt, role, key, student_id=None, intent=None):
+    reply = await get(key)
+    if reply is not None:
+        yield reply
+        return
+
+    parts = []
+    # A stream cut short raises IncompleteStream here, so partial text is never stored
+    async for token in stream_llm(prompt, role, intent):
+        parts.append(token)
+        yield token
+
+    reply = "".join(parts)
+    if reply and reply != UNAVAILABLE_REPLY:
+        await put(key, reply, student_id)
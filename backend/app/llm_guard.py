@@ -1,22 +1,124 @@
-from .llm import call_llm
-
-def generate_guard_response(reason, role, user_message):
-    try:
-        prompt = f"""
-You are a school safety assistant.
-User role: {role}
-Violation type: {reason}
-
-User message:
-{user_message}
-
-Respond politely, safely, and professionally.
-Do NOT provide any harmful, illegal, or sensitive information.
-Keep the response short and supportive.
-"""
-        return call_llm(prompt, role)
-    except Exception:
-        return (
-            "Your message cannot be processed due to safety policies. "
-            "Please contact the school office for further assistance."
-        )
+import itertools
+import os
+import random
+
+from . import intent_router as intents
+from . import llm_cache, prompts
+
+# =====================================================
+# 🛡️ GUARD REPLIES
+# Blocked messages are answered from a fixed template bank.
+# The LLM is only asked when GUARD_USE_LLM is set (plan_reply in
+# main builds that prompt, with the template as the fallback), and
+# then once per (role, reason) thanks to the LLM cache.
+# =====================================================
+
+GUARD_USE_LLM = os.getenv("GUARD_USE_LLM", "false").lower() in ("1", "true", "yes")
+
+# "rotate" cycles through the variants, "random" picks one, "first" is fixed
+GUARD_TEMPLATE_MODE = os.getenv("GUARD_TEMPLATE_MODE", "rotate").lower()
+
+GUARD_FALLBACK = (
+    "Your message cannot be processed due to safety policies. "
+    "Please contact the school office for further assistance."
+)
+
+# Reply bodies only; apply_tone adds the role greeting and sign-off
+GUARD_TEMPLATES = {
+    "SYSTEM": {
+        "student": [
+            "This request attempts to access restricted system information. "
+            "For security reasons, this action is not permitted.",
+            "I can't share system settings, passwords or other private details. "
+            "Ask me about your attendance or marks instead.",
+            "That information is protected, so I can't help with it. "
+            "I'm happy to answer questions about your studies.",
+        ],
+        "parent": [
+            "This request attempts to access restricted system information. "
+            "For security reasons, this action is not permitted.",
+            "System settings, credentials and payment details cannot be shared "
+            "through this assistant. Please contact the school office if you need help with an account.",
+        ],
+    },
+    "VIOLENCE": {
+        "student": [
+            "Your message contains violent or unsafe content. "
+            "If this concerns a real issue, please contact school authorities immediately.",
+            "I can't help with anything that could hurt you or someone else. "
+            "If something is worrying you, please talk to a teacher, counselor or someone you trust today.",
+            "That sounds serious. You don't have to deal with it alone, "
+            "so please speak to a teacher or the school counselor as soon as you can.",
+        ],
+        "parent": [
+            "Your message contains violent or unsafe content. "
+            "If this concerns a real issue, please contact school authorities immediately.",
+            "We are unable to discuss this topic here. If your child's safety "
+            "may be at risk, please call the school office or the relevant authorities right away.",
+        ],
+    },
+    "ILLEGAL": {
+        "student": [
+            "This request involves activities that are not allowed. "
+            "Please follow school policies and legal guidelines.",
+            "I can't help with that, as it goes against school rules and the law. "
+            "Let me know if you have a question about your classes.",
+            "That's not something I can assist with. I'm here for attendance, "
+            "marks and study questions.",
+        ],
+        "parent": [
+            "This request involves activities that are not allowed. "
+            "Please follow school policies and legal guidelines.",
+            "We cannot assist with this request. If you have concerns about your "
+            "child's conduct, the school counselor is available to help.",
+        ],
+    },
+    "ABUSE": {
+        "student": [
+            "Let's keep our communication respectful and positive. "
+            "I'm here to help with your school-related questions.",
+            "I'd like to keep this conversation friendly. "
+            "What would you like to know about your studies?",
+            "Kind words make this work better for everyone. "
+            "Ask me about your attendance, marks or subjects.",
+        ],
+        "parent": [
+            "Let's keep our communication respectful and positive. "
+            "I'm here to help with your school-related questions.",
+            "We ask that all messages stay courteous. We are glad to help "
+            "with any question about your child's academic progress.",
+        ],
+    },
+}
+
+# Flattened once at import: (role, reason) -> (variants, rotation counter)
+_BANK = {
+    (role, reason): (tuple(variants), itertools.count())
+    for reason, roles in GUARD_TEMPLATES.items()
+    for role, variants in roles.items()
+}
+
+
+def guard_reply(reason, role):
+    """A template reply for a blocked message; never calls the LLM."""
+    role = role.lower()
+    entry = _BANK.get((role, reason)) or _BANK.get(("student", reason))
+    if entry is None:
+        return GUARD_FALLBACK
+
+    variants, counter = entry
+    if GUARD_TEMPLATE_MODE == "random":
+        return random.choice(variants)
+    if GUARD_TEMPLATE_MODE == "rotate":
+        return variants[next(counter) % len(variants)]
+    return variants[0]
+
+
+def guard_cache_key(reason, role):
+    return llm_cache.make_key(role, intents.GUARD, reason)
+
+
+def build_guard_prompt(reason, role):
+    # The user's message is left out on purpose: the reply depends only on
+    # (role, reason), so one generation can be cached and reused.
+    return prompts.guard_prompt(reason, role)
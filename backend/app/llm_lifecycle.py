@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import os
+import time
+
+from app import llm
+from app.llm import OLLAMA_MODEL, keep_alive_value
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# 🔋 LLM LIFECYCLE
+# Ollama unloads a model once keep_alive runs out. Instead of
+# pinging /generate forever, we look at /api/ps (no generation)
+# on every backend and load the model only when users have been
+# active recently or a request just found it missing. Backends
+# that fail the check are ejected from the pool until they pass.
+#
+# Ready means some backend can serve the model: it is reachable
+# and has the model installed (/api/tags), and the last attempt
+# to load it didn't fail. Whether the model is loaded right now
+# is reported next to it, and does not affect readiness.
+# =====================================================
+
+# Seconds between /api/ps checks
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "30"))
+
+# Keep the model warm while there was LLM traffic in this many seconds
+OLLAMA_WARM_WINDOW = float(os.getenv("OLLAMA_WARM_WINDOW", "900"))
+
+# Load the model once at startup, before the first user asks
+OLLAMA_WARM_ON_START = os.getenv("OLLAMA_WARM_ON_START", "true").lower() in ("1", "true", "yes")
+
+# Floor between checks, however many requests ask for one
+OLLAMA_MIN_RECHECK = 2.0
+
+LATENCY_SMOOTHING = 0.2
+
+
+def _same_model(name):
+    wanted = OLLAMA_MODEL if ":" in OLLAMA_MODEL else f"{OLLAMA_MODEL}:latest"
+    return name in (OLLAMA_MODEL, wanted)
+
+
+class BackendHealth:
+    def __init__(self):
+        self.reachable = False
+        self.installed = False       # listed by /api/tags
+        self.loaded = False          # listed by /api/ps
+        self.load_failed = False     # the last warm-up failed
+        self.warm_ms = None
+        self.last_warm = None
+        self.last_error = None
+
+
+class ModelHealth:
+    def __init__(self):
+        self.hosts = {}              # Backend.base -> BackendHealth
+        self.last_check = None
+        self.last_traffic = None
+        self.last_warm = None
+        self.latency_ms = None       # smoothed generation time
+        self.failures = 0            # consecutive failed generations
+        self._wake = None
+        self._task = None
+
+    def host(self, backend):
+        return self.hosts.setdefault(backend.base, BackendHealth())
+
+    @property
+    def reachable(self):
+        return any(h.reachable for h in self.hosts.values())
+
+    @property
+    def loaded(self):
+        return any(h.reachable and h.loaded for h in self.hosts.values())
+
+    @property
+    def available(self):
+        return any(
+            h.reachable and h.installed and not h.load_failed
+            for h in self.hosts.values()
+        )
+
+    @property
+    def ready(self):
+        return self.available and self.failures == 0
+
+    # ---------- fed by llm_scheduler ----------
+
+    def record_traffic(self):
+        self.last_traffic = time.monotonic()
+        if not self.loaded:
+            self.wake()
+
+    def record_result(self, seconds, ok):
+        if not ok:
+            self.failures += 1
+            self.wake()
+            return
+
+        self.failures = 0
+        ms = seconds * 1000
+        if self.latency_ms is None:
+            self.latency_ms = ms
+        else:
+            self.latency_ms += LATENCY_SMOOTHING * (ms - self.latency_ms)
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    # ---------- background loop ----------
+
+    def _traffic_expected(self):
+        if self.last_traffic is None:
+            return OLLAMA_WARM_ON_START and self.last_warm is None
+        return time.monotonic() - self.last_traffic < OLLAMA_WARM_WINDOW
+
+    async def check(self):
+        warm = self._traffic_expected()
+        await asyncio.gather(*(
+            self.check_backend(backend, warm) for backend in llm.pool.backends
+        ))
+
+        if self.available:
+            self.failures = 0
+        self.last_check = time.time()
+
+    async def check_backend(self, backend, warm):
+        host = self.host(backend)
+        try:
+            host.loaded = await self._has_model(backend, "ps")
+            # A loaded model is installed; otherwise ask which ones are
+            host.installed = host.loaded or await self._has_model(backend, "tags")
+        except Exception as e:
+            logger.warning("Ollama health check failed for %s: %s", backend.base, e)
+            host.reachable = host.loaded = host.installed = False
+            host.last_error = str(e)
+            backend.eject()
+            return
+
+        host.reachable = True
+        host.last_error = None
+        if host.loaded:
+            host.load_failed = False
+        elif not host.installed:
+            host.last_error = f"model {OLLAMA_MODEL} is not installed"
+
+        if backend.ejected():
+            backend.readmit()
+
+        # After a failed load, retry on every check even without traffic:
+        # it is the only way to learn the model can be loaded again
+        if host.installed and not host.loaded and (warm or host.load_failed):
+            # A slow or failed load doesn't make the host unreachable;
+            # keep it in rotation and try again on the next check
+            try:
+                await self.warm(backend, host)
+            except Exception as e:
+                logger.warning("Ollama model load failed on %s: %s", backend.base, e)
+                host.load_failed = True
+                host.last_error = f"warm-up failed: {e}"
+
+    async def _has_model(self, backend, endpoint):
+        res = await backend.client.get(f"{backend.base}/api/{endpoint}")
+        res.raise_for_status()
+        models = res.json().get("models") or []
+        return any(_same_model(m.get("name") or m.get("model", "")) for m in models)
+
+    async def warm(self, backend, host):
+        # An empty prompt loads the model without generating anything
+        t0 = time.perf_counter()
+        res = await backend.client.post(backend.generate_url, json={
+            "model": OLLAMA_MODEL,
+            "prompt": "",
+            "keep_alive": keep_alive_value(),
+            "stream": False,
+        })
+        res.raise_for_status()
+
+        host.warm_ms = round((time.perf_counter() - t0) * 1000, 1)
+        host.last_warm = self.last_warm = time.time()
+        host.loaded = True
+        host.load_failed = False
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(OLLAMA_MIN_RECHECK)
+            try:
+                await asyncio.wait_for(
+                    self._wake.wait(), OLLAMA_HEALTH_INTERVAL - OLLAMA_MIN_RECHECK
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wake = None
+
+    def state(self):
+        backends = []
+        for backend in llm.pool.backends:
+            host = self.host(backend)
+            backends.append({
+                **backend.state(),
+                "reachable": host.reachable,
+                "installed": host.installed,
+                "loaded": host.loaded,
+                "load_failed": host.load_failed,
+                "warm_ms": host.warm_ms,
+                "last_error": host.last_error,
+            })
+
+        return {
+            "ready": self.ready,
+            "model": OLLAMA_MODEL,
+            "reachable": self.reachable,
+            "loaded": self.loaded,
+            "consecutive_failures": self.failures,
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "last_check": self.last_check,
+            "last_warm": self.last_warm,
+            "last_error": None if llm.pool.backends else "OLLAMA_URL not set",
+            "backends": backends,
+        }
+
+
+health = ModelHealth()
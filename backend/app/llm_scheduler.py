@@ -0,0 +1,234 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+
+from app import llm
+from app.llm_lifecycle import health
+from app import intent_router as intents
+from app import metrics, tracing
+
+# =====================================================
+# 🚦 LLM SCHEDULER
+# A fixed number of generations run at once; the rest wait in a
+# priority queue. When the queue is full or a wait runs too long,
+# the request is shed and the caller answers from a template.
+# =====================================================
+
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "2"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))  # seconds
+
+# Within a class, shorter prompts go first (one step per N characters)
+LLM_PROMPT_BUCKET_CHARS = int(os.getenv("LLM_PROMPT_BUCKET_CHARS", "500"))
+
+# Lower runs first
+INTENT_PRIORITY = {
+    intents.GUARD: 0,
+    intents.PERFORMANCE: 1,
+    intents.ADVISOR: 2,
+}
+DEFAULT_PRIORITY = 3
+
+BUSY_REPLY = (
+    "Our AI assistant is busy right now. "
+    "Please try again in a moment."
+)
+
+TIMING_SAMPLES = 1024
+
+
+class Overloaded(Exception):
+    """The request was shed; answer with the plan's fallback instead."""
+
+
+class _Timings:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=TIMING_SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._recent.append(seconds)
+
+    def summary(self):
+        recent = sorted(self._recent)
+
+        def pct(p):
+            if not recent:
+                return None
+            return round(recent[min(len(recent) - 1, int(len(recent) * p))] * 1000, 1)
+
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 1) if self.count else None,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+
+class _IntentStats:
+    def __init__(self):
+        self.admitted = 0
+        self.shed = 0
+        self.queue_wait = _Timings()
+        self.generation = _Timings()
+
+
+class LLMScheduler:
+    def __init__(self, max_in_flight, max_queue, queue_timeout):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiting = []      # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._stats = defaultdict(_IntentStats)
+
+    def priority(self, intent, prompt):
+        rank = INTENT_PRIORITY.get(intent, DEFAULT_PRIORITY)
+        return rank, len(prompt or "") // max(LLM_PROMPT_BUCKET_CHARS, 1)
+
+    def queued(self):
+        return sum(1 for _, _, future in self._waiting if not future.done())
+
+    def _shed(self, stats):
+        stats.shed += 1
+        raise Overloaded()
+
+    def _make_room(self, priority):
+        """Drop the lowest-priority waiter if the newcomer outranks it."""
+        live = [entry for entry in self._waiting if not entry[2].done()]
+        if len(live) < self.max_queue:
+            return True
+
+        worst = max(live)
+        if worst[0] <= priority:
+            return False
+
+        worst[2].set_exception(Overloaded())
+        return True
+
+    async def _acquire(self, intent, priority):
+        stats = self._stats[intent]
+
+        if self.in_flight < self.max_in_flight and not self.queued():
+            self.in_flight += 1
+            return
+
+        if self.max_queue <= 0 or not self._make_room(priority):
+            self._shed(stats)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._seq), future))
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self._shed(stats)
+            # Evicted by _make_room just as the wait ran out
+            if future.exception() is not None:
+                self._shed(stats)
+            # Otherwise the slot arrived with the timeout; keep it
+        except Overloaded:
+            self._shed(stats)
+        except asyncio.CancelledError:
+            # Client went away; hand the slot on if we were just given one
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release()
+            else:
+                future.cancel()
+            raise
+
+    def _release(self):
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                future.set_result(None)   # slot passes straight to the waiter
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, intent, prompt):
+        stats = self._stats[intent]
+        label = intent or "none"
+        queued_at = time.perf_counter()
+        queued_ns = time.time_ns()
+
+        try:
+            await self._acquire(intent, self.priority(intent, prompt))
+        except Overloaded:
+            if metrics.METRICS_ENABLED:
+                metrics.LLM_SHED.inc(intent=label)
+            raise
+
+        started = time.perf_counter()
+        started_ns = time.time_ns()
+        stats.admitted += 1
+        stats.queue_wait.add(started - queued_at)
+        metrics.observe(metrics.LLM_QUEUE_SECONDS, started - queued_at, intent=label)
+        tracing.record("llm.queue", queued_ns, started_ns, intent=label)
+
+        try:
+            yield
+        finally:
+            generation = time.perf_counter() - started
+            stats.generation.add(generation)
+            metrics.observe(metrics.LLM_GENERATION_SECONDS, generation, intent=label)
+            tracing.record("llm.generate", started_ns, intent=label)
+            self._release()
+
+    def stats(self):
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued(),
+            "intents": {
+                intent: {
+                    "admitted": s.admitted,
+                    "shed": s.shed,
+                    "queue_wait": s.queue_wait.summary(),
+                    "generation": s.generation.summary(),
+                }
+                for intent, s in sorted(self._stats.items(), key=lambda i: str(i[0]))
+            },
+        }
+
+
+scheduler = LLMScheduler(LLM_MAX_IN_FLIGHT, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT)
+
+
+# =====================================================
+# 🤖 SCHEDULED CALLS (same shape as app.llm)
+# =====================================================
+
+async def call_llm(prompt, role, intent=None):
+    health.record_traffic()
+    async with scheduler.slot(intent, prompt):
+        t0 = time.perf_counter()
+        reply = await llm.call_llm(prompt, role)
+        health.record_result(time.perf_counter() - t0, reply != llm.UNAVAILABLE_REPLY)
+        return reply
+
+
+async def stream_llm(prompt, role, intent=None):
+    health.record_traffic()
+    async with scheduler.slot(intent, prompt):
+        t0 = time.perf_counter()
+        first = True
+        async for token in llm.stream_llm(prompt, role):
+            if first:
+                health.record_result(time.perf_counter() - t0, token != llm.UNAVAILABLE_REPLY)
+                first = False
+            yield token
@@ -1,45 +1,107 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+from typing import NamedTuple, Optional
+from datetime import date
+import asyncio
+import json
+import logging
 import re
+import time
 
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.academic_intent import is_raw_marks_query
-from app.attendance_intent import is_attendance_query
-from app.advisor_intent import is_advisor_query
-from app.time_parser import extract_month_year
+from app import intent_router as intents
+from app.intent_router import RoutedMessage, route_chat
+from app.time_parser import (
+    extract_month_year,
+    extract_relative_period,
+    relative_window,
+    MONTH_MAP,
+    PERIOD_LABELS,
+)
 
 from app.admin_routes import router as admin_router
-from app.database import SessionLocal, engine
-from app import models, schemas
-from app.filters import filter_input, apply_tone
-from app.llm_guard import generate_guard_response
-from app.llm import call_llm
+from app.database import ReadSessionLocal, engine, read_engine, run_db
+from app import schemas, llm_cache, chat_log, prompts, retention, metrics, tracing, profiling
+from app.chat_log import record_chat
+from app.filters import apply_tone, tone_frame, EMPTY_REPLY_FALLBACK
+from app.llm_guard import (
+    GUARD_USE_LLM,
+    guard_reply,
+    guard_cache_key,
+    build_guard_prompt,
+)
+from app.llm import IncompleteStream, close_client
+from app import llm_scheduler
+from app.llm_scheduler import Overloaded
+from app.rate_limit import chat_rate_limit
 
 from app.services import (
     fetch_student_data,
     fetch_attendance_summary,
+    summarize_attendance,
     fetch_attendance_by_date,
     fetch_average_score,
     get_strongest_and_weakest_subject,
-    generate_smart_school_reply,
-    save_chat,
+    fetch_advisor_data,
+    build_advisor_fallback,
 )
 
-from app.models import ChatHistory
-from app.ollama_warmup import start_warmup
+from app.history import (
+    fetch_history_page,
+    InvalidCursor,
+    HISTORY_PAGE_SIZE,
+    HISTORY_MAX_PAGE_SIZE,
+)
+from app.llm_lifecycle import health as llm_health
+from app.migrations import run_migrations
+
+
+logger = logging.getLogger(__name__)
 
 
 # ----------------- STARTUP -----------------
-start_warmup()
 load_dotenv()
-models.Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+if metrics.METRICS_ENABLED:
+    metrics.instrument_engine(engine, "primary")
+    db_engines = {"primary": engine}
+    if read_engine is not engine:
+        metrics.instrument_engine(read_engine, "replica")
+        db_engines["replica"] = read_engine
+    metrics.install_gauges(db_engines)
+
+if tracing.TRACING_ENABLED:
+    tracing.instrument_engine(engine)
+    if read_engine is not engine:
+        tracing.instrument_engine(read_engine)
+    if tracing.TRACE_SQL_ROWS:
+        tracing.instrument_sessions(Session)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    chat_log.writer.start()
+    tracing.exporter.start()
+    llm_health.start()
+    retention.schedule.start()
+    yield
+    await retention.schedule.stop()
+    await llm_health.stop()
+    await asyncio.to_thread(chat_log.writer.stop)
+    await asyncio.to_thread(tracing.exporter.stop)
+    await close_client()
+
 
 app = FastAPI(
     title="Smart School Chatbot Backend",
     description="SQL-first Academic Chatbot (STRICT + AUTHORIZED)",
-    version="4.6.2"
+    version="4.6.2",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -48,14 +110,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[tracing.TRACE_HEADER],
 )
 
+# Off until an admin starts a session at /admin/profile/start
+app.add_middleware(profiling.ProfileMiddleware)
+
+# Outermost, so the trace covers CORS and every route
+app.add_middleware(tracing.TraceMiddleware)
+
 app.include_router(admin_router)
 
 
 # ----------------- DB -----------------
+# Chat endpoints only read; chat logging writes through app.chat_log
 def get_db():
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
@@ -67,240 +137,371 @@ def health():
     return {"status": "ok", "message": "Smart School Chatbot Running"}
 
 
+if metrics.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/health/ready")
+def health_ready():
+    """
+    200 while some Ollama backend is reachable and can load the model,
+    503 otherwise. Whether it is loaded right now is the "loaded" field:
+    Ollama unloads an idle model, and that must not take the pod out of
+    rotation, or it would never get the traffic that warms it again.
+    """
+    state = llm_health.state()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+
 # ----------------- CHAT -----------------
-@app.post("/chat", response_model=schemas.ChatResponse)
-def chat(request: schemas.ChatRequest, db: Session = Depends(get_db)):
-    try:
-        msg = request.message.lower().strip()
-        msg = msg.replace("analyse", "analyze")
-
-        if re.fullmatch(r"\d{4}", msg):
-            msg = f"attendance {msg}"
-
-        # ======================================================
-        # 1️⃣ SAFETY FILTER
-        # ======================================================
-        allowed, reason, _ = filter_input(request.message)
-        if not allowed:
-            reply = apply_tone(
-                request.role,
-                generate_guard_response(reason, request.role, request.message),
-                reason
-            )
-            save_chat(db, request.role, request.message, reply, request.student_id)
-            return {"reply": reply}
-
-        # ======================================================
-        # 🚨 BLOCK OTHER STUDENTS
-        # ======================================================
-        if any(k in msg for k in [
-            "student id", "student with id", "another student",
-            "other student", "friend", "friend's",
-            "classmate", "someone else"
-        ]):
-            reply = apply_tone(
-                request.role,
-                "I can share academic details only for the currently logged-in student."
-            )
-            save_chat(db, request.role, request.message, reply, request.student_id)
-            return {"reply": reply}
-
-        # ======================================================
-        # 🚫 HARD BLOCK — WRITE / MODIFY REQUESTS
-        # ======================================================
-        if any(w in msg for w in [
-            "update", "delete", "change", "edit", "modify",
-            "remove", "erase", "correct", "alter"
-        ]):
-            reply = apply_tone(
-                request.role,
-                "You are not authorized to modify academic records."
-            )
-            save_chat(db, request.role, request.message, reply, request.student_id)
-            return {"reply": reply}
-
-        # ======================================================
-        # 📊 AVERAGE SCORE
-        # ======================================================
-        if request.student_id and "average" in msg:
-            reply = apply_tone(
-                request.role,
-                fetch_average_score(db, request.student_id)
-            )
-            save_chat(db, request.role, request.message, reply, request.student_id)
-            return {"reply": reply}
-
-        # ======================================================
-        # 📅 ATTENDANCE
-        # ======================================================
-        if request.student_id and is_attendance_query(msg):
-
-            natural_date = re.search(
-                r"\b(\d{1,2})\s+"
-                r"(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec|"
-                r"january|february|march|april|june|july|august|september|"
-                r"october|november|december)\s+"
-                r"(19\d{2}|20\d{2})\b",
-                msg
-            )
+NATURAL_DATE_PATTERN = re.compile(
+    r"\b(\d{1,2})\s+"
+    r"(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec|"
+    r"january|february|march|april|june|july|august|september|"
+    r"october|november|december)\s+"
+    r"(19\d{2}|20\d{2})\b"
+)
 
-            if natural_date:
-                day = int(natural_date.group(1))
-                month_word = natural_date.group(2)
-                year = int(natural_date.group(3))
-
-                month_map = {
-                    "jan": 1, "january": 1,
-                    "feb": 2, "february": 2,
-                    "mar": 3, "march": 3,
-                    "apr": 4, "april": 4,
-                    "may": 5,
-                    "jun": 6, "june": 6,
-                    "jul": 7, "july": 7,
-                    "aug": 8, "august": 8,
-                    "sep": 9, "sept": 9, "september": 9,
-                    "oct": 10, "october": 10,
-                    "nov": 11, "november": 11,
-                    "dec": 12, "december": 12,
-                }
-
-                month = month_map[month_word]
-                date_str = f"{year}-{month:02d}-{day:02d}"
-                reply = fetch_attendance_by_date(db, request.student_id, date_str)
 
-            else:
-                month, year = extract_month_year(msg)
-
-                if year and not month:
-                    reply = fetch_attendance_summary(db, request.student_id, None, year)
-                elif month == "INVALID_MONTH":
-                    reply = "Invalid month specified. Please use January–December or 1–12."
-                elif year == "INVALID_YEAR":
-                    reply = "Invalid year specified. Attendance data is available only up to the current year."
-                elif month and year:
-                    reply = fetch_attendance_summary(db, request.student_id, month, year)
-                else:
-                    reply = (
-                        "Please specify attendance like:\n"
-                        "- Was I present on 17 September 2025\n"
-                        "- Attendance of October 2025\n"
-                        "- Attendance percentage for 2025"
-                    )
-
-            reply = apply_tone(request.role, reply)
-            save_chat(db, request.role, request.message, reply, request.student_id)
-            return {"reply": reply}
-
-        # ======================================================
-        # 📘 SUBJECT PERFORMANCE
-        # ======================================================
-        if request.student_id and re.search(
-            r"\b(how|did|am|is)\b.*\b(i|he|she|my\s+child|my\s+son|my\s+daughter)\b.*\b(perform|performance|doing)\b.*\b(english|math|science|history)\b",
-            msg
-        ):
-            db_data = fetch_student_data(db, request.message, request.student_id)
-
-            prompt = f"""
-Question:
-"{request.message}"
-
-Academic records:
-{db_data}
-
-RULES:
-- Answer ONLY for the subject asked
-- Use ONLY the marks shown
-- No advice
-- No bullet points
-- 2 short sentences
-- Neutral tone
-"""
-
-            reply = apply_tone(request.role, call_llm(prompt, request.role))
-            save_chat(db, request.role, request.message, reply, request.student_id)
-            return {"reply": reply}
-
-        # ======================================================
-        # 🟢 RAW MARKS
-        # ======================================================
-        if request.student_id and is_raw_marks_query(msg):
-            reply = apply_tone(
-                request.role,
-                fetch_student_data(db, request.message, request.student_id)
-            )
-            save_chat(db, request.role, request.message, reply, request.student_id)
-            return {"reply": reply}
-
-        # ======================================================
-        # 🧠 STRONGEST / WEAKEST
-        # ======================================================
-        if request.student_id and any(w in msg for w in [
-            "strongest", "weakest",
-            "strong", "weak",
-            "best", "worst",
-            "highest", "lowest"
-        ]):
-            strongest, weakest = get_strongest_and_weakest_subject(
-                db, request.student_id
+class ReplyPlan(NamedTuple):
+    intent: str
+    reason: str
+    text: Optional[str]     # final text for SQL-only branches
+    prompt: Optional[str]   # set when the reply has to come from the LLM
+    cache_key: Optional[str] = None
+    fallback: Optional[str] = None  # answer if the LLM scheduler sheds the request
+
+
+async def plan_reply(
+    request: schemas.ChatRequest, routed: RoutedMessage, db: Session
+) -> ReplyPlan:
+    # One pass over the message (in route_chat) decides the branch below
+    msg, route = routed
+    tracing.annotate(intent=route.intent)
+    profiling.set_intent(route.intent)
+
+    # ======================================================
+    # 1️⃣ SAFETY FILTER
+    # ======================================================
+    if route.intent == intents.GUARD:
+        template = guard_reply(route.reason, request.role)
+
+        if not GUARD_USE_LLM:
+            return ReplyPlan(route.intent, route.reason, template, None)
+
+        return ReplyPlan(
+            route.intent, route.reason, None,
+            build_guard_prompt(route.reason, request.role),
+            guard_cache_key(route.reason, request.role),
+            fallback=template
+        )
+
+    # ======================================================
+    # 🚨 BLOCK OTHER STUDENTS
+    # ======================================================
+    if route.intent == intents.OTHER_STUDENT:
+        return ReplyPlan(
+            route.intent, "OK",
+            "I can share academic details only for the currently logged-in student.",
+            None
+        )
+
+    # ======================================================
+    # 🚫 HARD BLOCK — WRITE / MODIFY REQUESTS
+    # ======================================================
+    if route.intent == intents.WRITE_BLOCK:
+        return ReplyPlan(
+            route.intent, "OK",
+            "You are not authorized to modify academic records.",
+            None
+        )
+
+    # ======================================================
+    # 📊 AVERAGE SCORE
+    # ======================================================
+    if route.intent == intents.AVERAGE:
+        reply = await run_db(fetch_average_score, db, request.student_id)
+        return ReplyPlan(route.intent, "OK", reply, None)
+
+    # ======================================================
+    # 📅 ATTENDANCE
+    # ======================================================
+    if route.intent == intents.ATTENDANCE:
+
+        natural_date = NATURAL_DATE_PATTERN.search(msg)
+
+        if natural_date:
+            day = int(natural_date.group(1))
+            month = MONTH_MAP[natural_date.group(2)]
+            year = int(natural_date.group(3))
+
+            date_str = f"{year}-{month:02d}-{day:02d}"
+            reply = await run_db(
+                fetch_attendance_by_date, db, request.student_id, date_str
             )
 
-            if not strongest:
-                reply = "No academic records found."
-            elif any(w in msg for w in [
-                "strongest", "strong", "best", "highest"
-            ]):
-                reply = f"Your strongest subject is **{strongest}**."
-            elif any(w in msg for w in [
-                "weakest", "weak", "worst", "lowest"
-            ]):
-                reply = f"Your weakest subject is **{weakest}**."
+        else:
+            month, year = extract_month_year(msg)
+            period = extract_relative_period(msg)
+
+            if year and not month:
+                reply = await run_db(
+                    fetch_attendance_summary, db, request.student_id, None, year
+                )
+            elif month == "INVALID_MONTH":
+                reply = "Invalid month specified. Please use January–December or 1–12."
+            elif year == "INVALID_YEAR":
+                reply = "Invalid year specified. Attendance data is available only up to the current year."
+            elif month and year:
+                reply = await run_db(
+                    fetch_attendance_summary, db, request.student_id, month, year
+                )
+            elif period:
+                reply = await run_db(
+                    summarize_attendance, db, request.student_id,
+                    relative_window(period), PERIOD_LABELS[period]
+                )
             else:
-                reply = "Please specify whether you want strongest or weakest subject."
-
-            reply = apply_tone(request.role, reply)
-            save_chat(db, request.role, request.message, reply, request.student_id)
-            return {"reply": reply}
-
-        # ======================================================
-        # 🔵 ADVISOR
-        # ======================================================
-        if request.student_id and is_advisor_query(msg):
-            reply = apply_tone(
-                request.role,
-                generate_smart_school_reply(
-                    db, request.student_id, request.role, request.message
+                reply = (
+                    "Please specify attendance like:\n"
+                    "- Was I present on 17 September 2025\n"
+                    "- Attendance of October 2025\n"
+                    "- Attendance percentage for 2025"
                 )
+
+        return ReplyPlan(route.intent, "OK", reply, None)
+
+    # ======================================================
+    # 📘 SUBJECT PERFORMANCE
+    # ======================================================
+    if route.intent == intents.PERFORMANCE:
+        db_data = await run_db(
+            fetch_student_data, db, request.message, request.student_id
+        )
+
+        return ReplyPlan(
+            route.intent, "OK", None,
+            prompts.performance_prompt(db_data, request.message, request.role),
+            llm_cache.make_key(request.role, request.message, db_data),
+            fallback=db_data
+        )
+
+    # ======================================================
+    # 🟢 RAW MARKS
+    # ======================================================
+    if route.intent == intents.RAW_MARKS:
+        reply = await run_db(
+            fetch_student_data, db, request.message, request.student_id
+        )
+        return ReplyPlan(route.intent, "OK", reply, None)
+
+    # ======================================================
+    # 🧠 STRONGEST / WEAKEST
+    # ======================================================
+    if route.intent == intents.STRENGTH:
+        strongest, weakest = await run_db(
+            get_strongest_and_weakest_subject, db, request.student_id
+        )
+
+        if not strongest:
+            reply = "No academic records found."
+        elif "strong" in route.matches:
+            reply = f"Your strongest subject is **{strongest}**."
+        elif "weak" in route.matches:
+            reply = f"Your weakest subject is **{weakest}**."
+        else:
+            reply = "Please specify whether you want strongest or weakest subject."
+
+        return ReplyPlan(route.intent, "OK", reply, None)
+
+    # ======================================================
+    # 🔵 ADVISOR
+    # ======================================================
+    if route.intent == intents.ADVISOR:
+        data = await run_db(fetch_advisor_data, db, request.student_id)
+
+        if data is None:
+            return ReplyPlan(
+                route.intent, "OK",
+                "No academic data available to generate suggestions.",
+                None
             )
-            save_chat(db, request.role, request.message, reply, request.student_id)
-            return {"reply": reply}
-
-        # ======================================================
-        # ❌ HARD BLOCK
-        # ======================================================
-        reply = apply_tone(
-            request.role,
-            "I can help only with school-related topics like attendance, marks, exams, and performance."
+
+        return ReplyPlan(
+            route.intent, "OK", None,
+            prompts.advisor_prompt(data, request.message, request.role),
+            llm_cache.make_key(request.role, request.message, data),
+            fallback=build_advisor_fallback(data)
         )
-        save_chat(db, request.role, request.message, reply, request.student_id)
-        return {"reply": reply}
+
+    # ======================================================
+    # ❌ HARD BLOCK
+    # ======================================================
+    return ReplyPlan(
+        route.intent, "OK",
+        "I can help only with school-related topics like attendance, marks, exams, and performance.",
+        None
+    )
+
+
+TECHNICAL_ISSUE_REPLY = (
+    "We are experiencing a technical issue. Please contact the school office."
+)
+INCOMPLETE_REPLY = "The AI service stopped before finishing this answer. Please ask again."
+
+
+@app.post(
+    "/chat",
+    response_model=schemas.ChatResponse,
+    dependencies=[Depends(chat_rate_limit)]
+)
+async def chat(
+    request: schemas.ChatRequest,
+    routed: RoutedMessage = Depends(route_chat),
+    db: Session = Depends(get_db),
+):
+    started = time.perf_counter()
+    intent = "error"
+    try:
+        plan = await plan_reply(request, routed, db)
+        intent = plan.intent
+
+        text = plan.text
+        try:
+            if plan.cache_key is not None:
+                text = await llm_cache.cached_call_llm(
+                    plan.prompt, request.role, plan.cache_key,
+                    request.student_id, plan.intent
+                )
+            elif plan.prompt is not None:
+                text = await llm_scheduler.call_llm(
+                    plan.prompt, request.role, plan.intent
+                )
+        except Overloaded:
+            text = plan.fallback or llm_scheduler.BUSY_REPLY
+
+        with tracing.span("apply_tone"):
+            reply = apply_tone(request.role, text, plan.reason)
 
     except Exception as e:
-        print("CHAT ERROR:", e)
-        reply = apply_tone(
-            request.role,
-            "We are experiencing a technical issue. Please contact the school office."
+        logger.exception("chat request failed")
+        tracing.mark_error(e)
+        reply = apply_tone(request.role, TECHNICAL_ISSUE_REPLY)
+
+    await record_chat(request.role, request.message, reply, request.student_id)
+    metrics.observe_chat("chat", intent, time.perf_counter() - started)
+    return {"reply": reply}
+
+
+# ----------------- CHAT STREAM -----------------
+def ndjson(**fields):
+    return json.dumps(fields, ensure_ascii=False) + "\n"
+
+
+@app.post("/chat/stream", dependencies=[Depends(chat_rate_limit)])
+async def chat_stream(
+    request: schemas.ChatRequest,
+    routed: RoutedMessage = Depends(route_chat),
+    db: Session = Depends(get_db),
+):
+    """
+    Same answers as /chat, sent as NDJSON lines ({"token": ...}) so the
+    tone prefix and the first model tokens reach the client immediately.
+    Ends with {"done": true}. If the model backend fails mid-reply, an
+    {"error": ...} line comes first and the tokens so far are incomplete.
+    """
+    started = time.perf_counter()
+    try:
+        plan = await plan_reply(request, routed, db)
+        intent = plan.intent
+    except Exception as e:
+        logger.exception("chat stream planning failed")
+        tracing.mark_error(e)
+        plan = ReplyPlan(intents.OUT_OF_SCOPE, "OK", TECHNICAL_ISSUE_REPLY, None)
+        intent = "error"
+
+    async def events():
+        if plan.prompt is None:
+            reply = apply_tone(request.role, plan.text, plan.reason)
+            yield ndjson(token=reply)
+        else:
+            prefix, suffix = tone_frame(request.role, plan.reason)
+            parts = []
+
+            if plan.cache_key is not None:
+                tokens = llm_cache.cached_stream_llm(
+                    plan.prompt, request.role, plan.cache_key,
+                    request.student_id, plan.intent
+                )
+            else:
+                tokens = llm_scheduler.stream_llm(
+                    plan.prompt, request.role, plan.intent
+                )
+
+            yield ndjson(token=prefix)
+            incomplete = False
+            try:
+                async for token in tokens:
+                    parts.append(token)
+                    yield ndjson(token=token)
+            except Overloaded:
+                # Shed before the first token
+                parts = [plan.fallback or llm_scheduler.BUSY_REPLY]
+                yield ndjson(token=parts[0])
+            except IncompleteStream:
+                incomplete = True
+
+            text = "".join(parts)
+            if incomplete:
+                yield ndjson(error=INCOMPLETE_REPLY)
+                text = text.rstrip() + " " + INCOMPLETE_REPLY
+            else:
+                if not text:
+                    text = EMPTY_REPLY_FALLBACK
+                    yield ndjson(token=text)
+                yield ndjson(token=suffix)
+
+            reply = prefix + text + ("" if incomplete else suffix)
+
+        yield ndjson(done=True)
+        await record_chat(
+            request.role, request.message, reply, request.student_id
         )
-        save_chat(db, request.role, request.message, reply, request.student_id)
-        return {"reply": reply}
+        metrics.observe_chat("chat_stream", intent, time.perf_counter() - started)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 
 # ----------------- CHAT HISTORY -----------------
-@app.get("/chat/history/{student_id}")
-def chat_history(student_id: int, db: Session = Depends(get_db)):
-    return (
-        db.query(ChatHistory)
-        .filter(ChatHistory.student_id == student_id)
-        .order_by(ChatHistory.timestamp.desc())
-        .limit(20)
-        .all()
+# Newest first; follow next_cursor for older pages
+@app.get("/chat/history/{student_id}", response_model=schemas.ChatHistoryPage)
+def chat_history(
+    student_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    role: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    try:
+        rows, next_cursor = fetch_history_page(
+            db, student_id, cursor, limit, role, start, end
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return schemas.ChatHistoryPage(
+        items=[
+            schemas.ChatHistoryResponse(
+                role=r.role,
+                user_message=r.user_message,
+                bot_reply=r.bot_reply,
+                timestamp=r.timestamp
+            )
+            for r in rows
+        ],
+        next_cursor=next_cursor
     )
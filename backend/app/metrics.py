@@ -0,0 +1,260 @@
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+# =====================================================
+# 📊 METRICS
+# Counters, gauges and histograms kept in process memory and
+# served at GET /metrics in the Prometheus text format (0.0.4).
+# Each worker process has its own numbers; scrape every worker
+# or run a single one behind the scraper.
+# =====================================================
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans a cached SQL answer (~1 ms) up to a slow CPU generation
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 120,
+)
+SQL_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1, 2.5,
+)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_labels(self.labelnames, values, extra)} {_number(value)}"
+            )
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", key, (), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """Set directly, or give `collect` returning [(label values, value)] at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.collect is not None:
+            items = [(tuple(str(v) for v in key), value) for key, value in self.collect()]
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [("", key, (), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # per-bucket counts, then sum and count
+                counts = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+
+        out = []
+        for key, counts in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                out.append(("_bucket", key, (("le", _number(bound)),), cumulative))
+            out.append(("_sum", key, (), counts[-2]))
+            out.append(("_count", key, (), counts[-1]))
+        return out
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# =====================================================
+# 🏷️ APPLICATION METRICS
+# =====================================================
+
+CHAT_REQUESTS = Counter(
+    "chat_requests_total", "Chat requests answered, by endpoint and intent branch",
+    ("endpoint", "intent"),
+)
+CHAT_SECONDS = Histogram(
+    "chat_request_seconds", "Chat request time from routing to saved reply",
+    ("endpoint", "intent"),
+)
+SQL_SECONDS = Histogram(
+    "sql_query_seconds", "Time per SQL statement",
+    ("engine", "statement"), buckets=SQL_BUCKETS,
+)
+LLM_QUEUE_SECONDS = Histogram(
+    "llm_queue_wait_seconds", "Time waiting for an LLM scheduler slot", ("intent",),
+)
+LLM_GENERATION_SECONDS = Histogram(
+    "llm_generation_seconds", "Time holding an LLM slot (generation)", ("intent",),
+)
+LLM_SHED = Counter(
+    "llm_shed_total", "LLM requests shed by the scheduler", ("intent",),
+)
+CHAT_SAVE_SECONDS = Histogram(
+    "chat_save_seconds", "Time the request spends saving its chat row", ("mode",),
+)
+CHAT_LOG_BATCH_SECONDS = Histogram(
+    "chat_log_batch_seconds", "Time to insert and commit one chat-log batch",
+)
+
+
+def observe_chat(endpoint, intent, seconds):
+    if not METRICS_ENABLED:
+        return
+    CHAT_REQUESTS.inc(endpoint=endpoint, intent=intent)
+    CHAT_SECONDS.observe(seconds, endpoint=endpoint, intent=intent)
+
+
+def observe(histogram, seconds, **labels):
+    if METRICS_ENABLED:
+        histogram.observe(seconds, **labels)
+
+
+# =====================================================
+# 🔌 HOOKS
+# =====================================================
+
+_VERBS = {"select", "insert", "update", "delete"}
+
+
+def instrument_engine(engine, name):
+    """Time every statement run through `engine`."""
+    if not METRICS_ENABLED:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+        SQL_SECONDS.observe(
+            time.perf_counter() - started,
+            engine=name, statement=verb if verb in _VERBS else "other",
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("metrics_started"):
+            conn.info["metrics_started"].pop()
+
+
+def install_gauges(engines):
+    """Scrape-time gauges over the LLM scheduler, Ollama pool, chat log and DB pools."""
+    from app.llm_scheduler import scheduler
+    from app.llm import pool as llm_pool
+    from app.chat_log import writer
+
+    def pool_values(read):
+        def collect():
+            values = []
+            for name, engine in engines.items():
+                try:
+                    values.append(((name,), read(engine.pool)))
+                except AttributeError:
+                    pass     # StaticPool (in-memory SQLite) has no counters
+            return values
+        return collect
+
+    Gauge("llm_in_flight", "LLM generations running now",
+          collect=lambda: [((), scheduler.in_flight)])
+    Gauge("llm_queued", "LLM requests waiting for a slot",
+          collect=lambda: [((), scheduler.queued())])
+    Gauge("ollama_backend_outstanding", "Requests in flight per Ollama backend", ("backend",),
+          collect=lambda: [((b.base,), b.outstanding) for b in llm_pool.backends])
+    Gauge("chat_log_pending", "Chat rows queued for the background writer",
+          collect=lambda: [((), writer.pending())])
+    Gauge("db_pool_checked_out", "Database connections in use", ("engine",),
+          collect=pool_values(lambda p: p.checkedout()))
+    Gauge("db_pool_size", "Database pool size", ("engine",),
+          collect=pool_values(lambda p: p.size()))
+    Gauge("db_pool_overflow", "Database connections opened beyond the pool size", ("engine",),
+          # QueuePool counts overflow from -size until the pool is full
+          collect=pool_values(lambda p: max(p.overflow(), 0)))
@@ -0,0 +1,229 @@
+from datetime import datetime
+import logging
+import os
+
+from sqlalchemy import (
+    Column, Date, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+    case, cast, extract, func, inspect, select, text,
+)
+from sqlalchemy.engine import Engine
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Step 2 adds unique indexes. If attendance/academics already hold
+# duplicate keys it stops, unless this allows deleting all but the
+# newest row (highest id) of each key.
+MIGRATION_DEDUPE = os.getenv("MIGRATION_DEDUPE", "false").lower() in ("1", "true", "yes")
+
+# Keys listed in the log or error message; the count covers all of them
+DUPLICATE_KEYS_SHOWN = 20
+
+# =====================================================
+# 🗂️ VERSIONED SCHEMA MIGRATIONS
+# Steps run once, in order, and are recorded in schema_version.
+# Each step spells out its own tables and indexes as they were
+# when it was written, instead of reading app.models, so a later
+# model change never alters what an old step does. Steps use
+# checkfirst, so they are safe against tables that already match.
+# =====================================================
+
+_meta = MetaData()
+
+schema_version = Table(
+    "schema_version", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _create_tables(conn):
+    meta = MetaData()
+    Table(
+        "master", meta,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("name", String, nullable=False),
+    )
+    Table(
+        "academics", meta,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("student_id", Integer, ForeignKey("master.id"), nullable=False),
+        Column("subject", String, nullable=False),
+        Column("score", Integer, nullable=False),
+    )
+    Table(
+        "attendance", meta,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("student_id", Integer, ForeignKey("master.id"), nullable=False),
+        Column("date", Date, nullable=False),
+        Column("status", String, nullable=False),
+    )
+    Table(
+        "chat_history", meta,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("student_id", Integer, nullable=True),
+        Column("role", String, nullable=False),
+        Column("user_message", Text, nullable=False),
+        Column("bot_reply", Text, nullable=False),
+        Column("timestamp", DateTime),
+    )
+    meta.create_all(bind=conn)
+
+
+def _dedupe(conn, table, columns):
+    """Delete all but the newest row per key, if MIGRATION_DEDUPE allows it."""
+    keys = ", ".join(columns)
+    duplicates = conn.execute(text(
+        f"SELECT {keys}, COUNT(*) - 1 AS extra FROM {table} "
+        f"GROUP BY {keys} HAVING COUNT(*) > 1 ORDER BY {keys}"
+    )).all()
+    if not duplicates:
+        return
+
+    extra = sum(row[-1] for row in duplicates)
+    shown = ", ".join(
+        str(tuple(row[:-1])) for row in duplicates[:DUPLICATE_KEYS_SHOWN]
+    )
+    if len(duplicates) > DUPLICATE_KEYS_SHOWN:
+        shown += f", ... ({len(duplicates) - DUPLICATE_KEYS_SHOWN} more)"
+
+    if not MIGRATION_DEDUPE:
+        raise RuntimeError(
+            f"{table} has {extra} duplicate rows over {len(duplicates)} "
+            f"({keys}) keys: {shown}. Remove them, or set MIGRATION_DEDUPE=true "
+            f"to keep only the newest row of each key."
+        )
+
+    deleted = conn.execute(text(
+        f"DELETE FROM {table} WHERE id NOT IN ("
+        f"SELECT id FROM (SELECT MAX(id) AS id FROM {table} "
+        f"GROUP BY {keys}) AS keep)"
+    )).rowcount
+    logger.warning(
+        "MIGRATION deleted %s duplicate %s rows over %s (%s) keys, keeping the newest: %s",
+        deleted, table, len(duplicates), keys, shown
+    )
+
+
+def _index(name, table, *columns, unique=False):
+    """An index on a stand-in table holding just the indexed columns."""
+    stub = Table(table, MetaData(), *(Column(c) for c in columns))
+    return Index(name, *(stub.c[c] for c in columns), unique=unique)
+
+
+def _add_hot_indexes(conn):
+    _dedupe(conn, "attendance", ["student_id", "date"])
+    _dedupe(conn, "academics", ["student_id", "subject"])
+
+    for index in (
+        _index("uq_attendance_student_date", "attendance", "student_id", "date", unique=True),
+        _index("uq_academics_student_subject", "academics", "student_id", "subject", unique=True),
+        _index("ix_chat_history_student_timestamp", "chat_history", "student_id", "timestamp"),
+    ):
+        index.create(bind=conn, checkfirst=True)
+
+
+def _add_attendance_rollup(conn):
+    meta = MetaData()
+    attendance = Table(
+        "attendance", meta,
+        Column("id", Integer),
+        Column("student_id", Integer),
+        Column("date", Date),
+        Column("status", String),
+    )
+    attendance_rollup = Table(
+        "attendance_rollup", meta,
+        Column("student_id", Integer, primary_key=True, autoincrement=False),
+        Column("year", Integer, primary_key=True, autoincrement=False),
+        Column("month", Integer, primary_key=True, autoincrement=False),
+        Column("present", Integer, nullable=False, default=0),
+        Column("absent", Integer, nullable=False, default=0),
+        Column("total", Integer, nullable=False, default=0),
+    )
+    attendance_rollup.create(bind=conn, checkfirst=True)
+
+    # Backfill from raw attendance (as app.rollup.rebuild did at the time)
+    status = func.lower(func.trim(attendance.c.status))
+    year = cast(extract("year", attendance.c.date), Integer)
+    month = cast(extract("month", attendance.c.date), Integer)
+
+    conn.execute(attendance_rollup.delete())
+    conn.execute(attendance_rollup.insert().from_select(
+        ["student_id", "year", "month", "present", "absent", "total"],
+        select(
+            attendance.c.student_id,
+            year,
+            month,
+            func.sum(case((status == "present", 1), else_=0)),
+            func.sum(case((status == "absent", 1), else_=0)),
+            func.count(attendance.c.id),
+        ).group_by(attendance.c.student_id, year, month)
+    ))
+
+
+def _history_keyset_index(conn):
+    # Compiled per dialect: MySQL needs DROP INDEX ... ON chat_history
+    _index(
+        "ix_chat_history_student_timestamp", "chat_history", "student_id", "timestamp"
+    ).drop(bind=conn, checkfirst=True)
+    _index(
+        "ix_chat_history_student_timestamp_id", "chat_history", "student_id", "timestamp", "id"
+    ).create(bind=conn, checkfirst=True)
+
+
+def _add_reply_templates(conn):
+    Table(
+        "reply_template", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("text_hash", String(64), nullable=False, unique=True),
+        Column("text", Text, nullable=False),
+    ).create(bind=conn, checkfirst=True)
+
+    columns = {c["name"] for c in inspect(conn).get_columns("chat_history")}
+    if "reply_template_id" not in columns:
+        conn.execute(text(
+            "ALTER TABLE chat_history ADD COLUMN reply_template_id INTEGER "
+            "REFERENCES reply_template(id)"
+        ))
+
+
+MIGRATIONS = [
+    (1, "baseline tables", _create_tables),
+    (2, "composite indexes on attendance, academics, chat_history", _add_hot_indexes),
+    (3, "attendance_rollup table", _add_attendance_rollup),
+    (4, "chat_history (student_id, timestamp, id) index", _history_keyset_index),
+    (5, "reply_template table and chat_history.reply_template_id", _add_reply_templates),
+]
+
+
+def current_version(conn) -> int:
+    schema_version.create(bind=conn, checkfirst=True)
+    version = conn.execute(
+        text("SELECT MAX(version) FROM schema_version")
+    ).scalar()
+    return version or 0
+
+
+def run_migrations(bind: Engine = engine):
+    with bind.begin() as conn:
+        version = current_version(conn)
+
+    for number, description, step in MIGRATIONS:
+        if number <= version:
+            continue
+
+        with bind.begin() as conn:
+            step(conn)
+            conn.execute(schema_version.insert().values(
+                version=number,
+                description=description,
+                applied_at=datetime.utcnow()
+            ))
+        print(f"MIGRATION {number} applied: {description}")
+
+
+if __name__ == "__main__":
+    run_migrations()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Text, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, Text, DateTime, Index
 from .database import Base
 from datetime import datetime
 
@@ -18,6 +18,10 @@ class Academics(Base):
     subject = Column(String, nullable=False)
     score = Column(Integer, nullable=False)
 
+    __table_args__ = (
+        Index("uq_academics_student_subject", "student_id", "subject", unique=True),
+    )
+
 
 class Attendance(Base):
     __tablename__ = "attendance"
@@ -28,6 +32,31 @@ class Attendance(Base):
     date = Column(Date, nullable=False)
     status = Column(String, nullable=False)  # Present / Absent
 
+    __table_args__ = (
+        Index("uq_attendance_student_date", "student_id", "date", unique=True),
+    )
+
+# Per-student, per-month attendance counts (kept in step by app/rollup.py)
+class AttendanceRollup(Base):
+    __tablename__ = "attendance_rollup"
+
+    student_id = Column(Integer, primary_key=True, autoincrement=False)
+    year = Column(Integer, primary_key=True, autoincrement=False)
+    month = Column(Integer, primary_key=True, autoincrement=False)
+
+    present = Column(Integer, nullable=False, default=0)
+    absent = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+
+# Bot replies shared by many chat_history rows, stored once
+class ReplyTemplate(Base):
+    __tablename__ = "reply_template"
+
+    id = Column(Integer, primary_key=True)
+    text_hash = Column(String(64), nullable=False, unique=True)  # sha256 of text
+    text = Column(Text, nullable=False)
+
+
 # Chat Memory
 class ChatHistory(Base):
     __tablename__ = "chat_history"
@@ -37,4 +66,11 @@ class ChatHistory(Base):
     role = Column(String, nullable=False)
     user_message = Column(Text, nullable=False)
     bot_reply = Column(Text, nullable=False)
-    timestamp = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    # Set by app/retention.py compaction; bot_reply is then ""
+    reply_template_id = Column(Integer, ForeignKey("reply_template.id"), nullable=True)
+
+    __table_args__ = (
+        # id breaks timestamp ties for keyset pagination (app/history.py)
+        Index("ix_chat_history_student_timestamp_id", "student_id", "timestamp", "id"),
+    )
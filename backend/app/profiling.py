@@ -0,0 +1,373 @@
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import site
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+# =====================================================
+# 🔬 ON-DEMAND PROFILING
+# Off until an admin starts a session (POST /admin/profile/start).
+# A session picks the next N requests, or a percentage of traffic,
+# under a path prefix, and profiles them in one of two modes:
+#
+#   cprofile -> deterministic cProfile of the request on the event
+#               loop plus its run_db calls on the DB threads; served
+#               as a pstats dump
+#   sample   -> a thread snapshots the stacks of profiled requests
+#               every PROFILE_SAMPLE_INTERVAL; served as collapsed
+#               stacks for flamegraph.pl / speedscope
+#
+# Results are grouped per (route, intent) and kept until the next
+# session starts.
+# =====================================================
+
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))  # seconds
+PROFILE_MAX_STACK_DEPTH = 64
+
+_current_request = ContextVar("profiled_request", default=None)
+
+
+class ProfiledRequest:
+    def __init__(self, session, endpoint):
+        self.session = session
+        self.endpoint = endpoint
+        self.intent = None
+        self.tasks = []             # sample: asyncio tasks registered with the sampler
+        self.profiles = []          # cprofile: one per thread the request ran on
+        self.stacks = Counter()     # sample: collapsed stack -> samples
+        self._lock = threading.Lock()
+
+    @property
+    def key(self):
+        return self.endpoint, self.intent or "-"
+
+    def track_task(self):
+        sampler = self.session.sampler
+        task = asyncio.current_task()
+        if sampler is not None and task is not None and task not in sampler.tasks:
+            sampler.tasks[task] = self
+            self.tasks.append(task)
+
+    def add_profile(self, profiler):
+        with self._lock:
+            self.profiles.append(profiler)
+
+
+class _Group:
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.stats = None           # pstats.Stats
+        self.stacks = Counter()
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "mean_ms": round(self.seconds / self.requests * 1000, 2) if self.requests else None,
+            "samples": sum(self.stacks.values()),
+            "has_pstats": self.stats is not None,
+        }
+
+
+# =====================================================
+# 🧵 STACK SAMPLER
+# =====================================================
+
+# Longest first, so site-packages wins over the stdlib directory holding it
+_PATH_PREFIXES = sorted(
+    {
+        os.path.join(p, "")
+        for p in (*site.getsitepackages(), sysconfig.get_paths()["stdlib"], os.getcwd())
+    },
+    key=len, reverse=True,
+)
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    path = code.co_filename
+    for prefix in _PATH_PREFIXES:
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+            break
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None and len(names) < PROFILE_MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    def __init__(self, interval):
+        self.interval = interval
+        self.loop = None
+        self.loop_thread = None
+        # A task's context can't be read from another thread (3.11), so
+        # profiled requests register their tasks and DB threads here
+        self.tasks = {}             # asyncio task -> ProfiledRequest
+        self.threads = {}           # thread id -> ProfiledRequest running run_db work
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, loop):
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+
+            # current_task(loop) is a dict lookup, safe to read from this thread
+            request = self.tasks.get(asyncio.current_task(self.loop))
+            if request is not None and self.loop_thread in frames:
+                request.stacks[_collapse(frames[self.loop_thread])] += 1
+
+            for thread_id, request in list(self.threads.items()):
+                if thread_id in frames:
+                    request.stacks[_collapse(frames[thread_id])] += 1
+
+
+# =====================================================
+# 🎛️ SESSION
+# =====================================================
+
+class ProfileSession:
+    def __init__(self, mode, requests=None, percent=None, path_prefix=""):
+        self.mode = mode
+        self.remaining = requests
+        self.percent = percent
+        self.path_prefix = path_prefix
+        self.started_at = time.time()
+        self.active = True
+        self.profiled = 0
+        self.skipped = 0            # cprofile: matched while another request held the profiler
+        self.in_flight = 0
+        self.groups = {}
+        self.sampler = None
+        self._loop_busy = False
+        self._lock = threading.Lock()
+
+    def wants(self, path):
+        if not self.active or not path.startswith(self.path_prefix):
+            return False
+        if path.startswith("/admin/profile"):
+            return False
+        if self.mode == "cprofile" and self._loop_busy:
+            self.skipped += 1
+            return False
+        if self.percent is not None and random.random() * 100 >= self.percent:
+            return False
+        if self.remaining is not None:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.active = False
+        return True
+
+    def finish(self, request, seconds):
+        if self.sampler is not None:
+            for task in request.tasks:
+                self.sampler.tasks.pop(task, None)
+
+        with self._lock:
+            group = self.groups.setdefault(request.key, _Group())
+            group.requests += 1
+            group.seconds += seconds
+            group.stacks.update(request.stacks)
+            for profiler in request.profiles:
+                if group.stats is None:
+                    group.stats = pstats.Stats(profiler)
+                else:
+                    group.stats.add(profiler)
+            self.profiled += 1
+            self.in_flight -= 1
+
+        if not self.active and self.in_flight == 0 and self.sampler is not None:
+            self.sampler.stop()
+            self.sampler = None
+
+    def stop(self):
+        self.active = False
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler = None
+
+    def select(self, endpoint=None, intent=None):
+        return [
+            (key, group) for key, group in sorted(self.groups.items())
+            if (endpoint is None or key[0] == endpoint)
+            and (intent is None or key[1] == intent)
+        ]
+
+    def state(self):
+        return {
+            "mode": self.mode,
+            "active": self.active,
+            "remaining": self.remaining,
+            "percent": self.percent,
+            "path_prefix": self.path_prefix,
+            "started_at": self.started_at,
+            "profiled": self.profiled,
+            "skipped": self.skipped,
+            "groups": [
+                {"endpoint": endpoint, "intent": intent, **group.summary()}
+                for (endpoint, intent), group in sorted(self.groups.items())
+            ],
+        }
+
+
+session = None
+
+
+def start(mode, requests=None, percent=None, path_prefix=""):
+    global session
+    if session is not None:
+        session.stop()
+    session = ProfileSession(mode, requests, percent, path_prefix)
+    if mode == "sample":
+        session.sampler = StackSampler(PROFILE_SAMPLE_INTERVAL)
+        session.sampler.start(asyncio.get_running_loop())
+    return session
+
+
+def set_intent(intent):
+    request = _current_request.get()
+    if request is not None:
+        request.intent = intent
+        # Streaming replies are produced in a task of their own
+        request.track_task()
+
+
+def run_in_worker(fn, *args, **kwargs):
+    """run_db's entry point on the DB thread; profiles fn if its request is profiled."""
+    request = _current_request.get()
+    if request is None:
+        return fn(*args, **kwargs)
+
+    if request.session.mode == "sample":
+        sampler = request.session.sampler
+        thread_id = threading.get_ident()
+        if sampler is not None:
+            sampler.threads[thread_id] = request
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if sampler is not None:
+                sampler.threads.pop(thread_id, None)
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+: one cProfile per process, and the loop's already sees this thread
+        return fn(*args, **kwargs)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        request.add_profile(profiler)
+
+
+# =====================================================
+# 📦 OUTPUT
+# =====================================================
+
+def merged_stats(groups, stream=None):
+    parts = [group.stats for _, group in groups if group.stats is not None]
+    if not parts:
+        return None
+    # A fresh Stats, so the groups' own stats stay untouched
+    merged = pstats.Stats(stream=stream)
+    merged.add(*parts)
+    return merged
+
+
+def pstats_dump(groups):
+    """Bytes in the format pstats.Stats(path) loads (as written by dump_stats)."""
+    merged = merged_stats(groups)
+    return marshal.dumps(merged.stats) if merged is not None else None
+
+
+def pstats_text(groups, limit=40, sort="cumulative"):
+    out = io.StringIO()
+    merged = merged_stats(groups, stream=out)
+    if merged is None:
+        return None
+    merged.sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def collapsed(groups, prefix_with_group=True):
+    """'frame;frame;frame count' lines; the group is the root frame when mixed."""
+    lines = []
+    for (endpoint, intent), group in groups:
+        for stack, count in group.stacks.most_common():
+            root = f"{endpoint} [{intent}];" if prefix_with_group else ""
+            lines.append(f"{root}{stack} {count}")
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+# =====================================================
+# 🌐 ASGI MIDDLEWARE
+# =====================================================
+
+class ProfileMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        current = session
+        if scope["type"] != "http" or current is None or not current.wants(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        request = ProfiledRequest(current, scope["path"])
+        current.in_flight += 1
+
+        # cProfile hooks the whole loop thread, so one request at a time holds it;
+        # other requests' loop work in that window is counted too
+        loop_profiler = None
+        if current.mode == "cprofile":
+            current._loop_busy = True
+            loop_profiler = cProfile.Profile()
+            loop_profiler.enable()
+
+        token = _current_request.set(request)
+        request.track_task()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_request.reset(token)
+            if loop_profiler is not None:
+                loop_profiler.disable()
+                request.add_profile(loop_profiler)
+                current._loop_busy = False
+
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                request.endpoint = route.path
+            current.finish(request, time.perf_counter() - started)
@@ -0,0 +1,186 @@
+import math
+import os
+from collections import defaultdict
+
+# =====================================================
+# ✏️ PROMPTS
+# Every LLM prompt is built here. Layout is fixed so the text
+# the model sees starts with the same bytes on every request
+# (Ollama can then reuse the evaluated prefix):
+#
+#   SYSTEM_PREFIX  -> identical for every request
+#   task rules     -> identical per task
+#   data           -> per student, as compact as possible
+#   question/role  -> per request
+# =====================================================
+
+# Rough per-request budget for the prompt (system prefix included)
+LLM_PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "400"))
+
+# Longest user question copied into a prompt, in characters
+LLM_PROMPT_MAX_QUESTION = int(os.getenv("LLM_PROMPT_MAX_QUESTION", "300"))
+
+# English text averages about 4 characters per token for Llama-family tokenizers
+CHARS_PER_TOKEN = 4
+
+SYSTEM_PREFIX = (
+    "You are a school academic assistant. "
+    "Use only the DATA given. Never invent marks, ranks or dates. "
+    "Talk only about academics. Do not mention you are an AI."
+)
+
+TASK_RULES = {
+    "advisor": (
+        "TASK: advise the student.\n"
+        "Find strengths and weak areas, then give at most 5 short, "
+        "practical, encouraging bullet points."
+    ),
+    "performance": (
+        "TASK: answer for the subject asked only.\n"
+        "Use only the marks shown. 2 short neutral sentences, no advice, no bullets."
+    ),
+    "guard": (
+        "TASK: a message was blocked for safety.\n"
+        "Reply politely in 2 short supportive sentences. "
+        "Give no harmful, illegal or sensitive information."
+    ),
+}
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+PREFIX_TOKENS = estimate_tokens(SYSTEM_PREFIX)
+
+
+# =====================================================
+# 📏 TOKEN ACCOUNTING
+# =====================================================
+
+class _PromptStats:
+    def __init__(self):
+        self.count = 0
+        self.tokens = 0
+        self.max = 0
+        self.trimmed = 0
+        self.over_budget = 0
+
+    def add(self, tokens, trimmed, over):
+        self.count += 1
+        self.tokens += tokens
+        self.max = max(self.max, tokens)
+        self.trimmed += trimmed
+        self.over_budget += over
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_tokens": round(self.tokens / self.count, 1) if self.count else None,
+            "max_tokens": self.max,
+            "trimmed": self.trimmed,
+            "over_budget": self.over_budget,
+        }
+
+
+_stats = defaultdict(_PromptStats)
+
+
+def stats():
+    return {
+        "token_budget": LLM_PROMPT_TOKEN_BUDGET,
+        "system_prefix_tokens": PREFIX_TOKENS,
+        "tasks": {task: s.summary() for task, s in sorted(_stats.items())},
+    }
+
+
+# =====================================================
+# 🧩 RENDERING
+# =====================================================
+
+def _question(message):
+    message = " ".join(message.split())
+    if len(message) > LLM_PROMPT_MAX_QUESTION:
+        message = message[:LLM_PROMPT_MAX_QUESTION].rstrip() + "…"
+    return message
+
+
+def _render(task, data_lines, question, role):
+    parts = [SYSTEM_PREFIX, TASK_RULES[task]]
+    if data_lines:
+        parts.append("DATA\n" + "\n".join(data_lines))
+    if question:
+        parts.append(f'Q ({role}): "{question}"')
+    else:
+        parts.append(f"Asked by: {role}")
+    return "\n\n".join(parts)
+
+
+def build(task, role, data_lines=(), question=None, optional_lines=()):
+    """
+    Render a prompt for `task` and record its size.
+
+    optional_lines are appended after data_lines, oldest first, and are
+    dropped from the front until the prompt fits LLM_PROMPT_TOKEN_BUDGET.
+    """
+    data_lines = list(data_lines)
+    optional = list(optional_lines)
+    question = _question(question) if question else None
+
+    text = _render(task, data_lines + optional, question, role)
+    trimmed = 0
+    while optional and estimate_tokens(text) > LLM_PROMPT_TOKEN_BUDGET:
+        optional.pop(0)
+        trimmed = 1
+        text = _render(task, data_lines + optional, question, role)
+
+    tokens = estimate_tokens(text)
+    _stats[task].add(tokens, trimmed, int(tokens > LLM_PROMPT_TOKEN_BUDGET))
+    return text
+
+
+# =====================================================
+# 📝 TASK PROMPTS
+# =====================================================
+
+def _pct(present, total):
+    return f"{round(present / total * 100, 1)}%" if total else "N/A"
+
+
+def attendance_lines(months, total_days, present_days):
+    """(totals line, one line per month oldest first) from per-month aggregates."""
+    total = f"Attendance (present/days): total {present_days}/{total_days} ({_pct(present_days, total_days)})"
+    per_month = [
+        f"{year}-{month:02d}: {present}/{days}"
+        for year, month, present, days in sorted(months)
+    ]
+    return total, per_month
+
+
+def advisor_prompt(data, message, role):
+    marks = ", ".join(m.replace(": ", " ") for m in data["marks"]) or "none"
+    total, per_month = attendance_lines(
+        data.get("months", []), data["total_days"], data["present_days"]
+    )
+
+    return build(
+        "advisor", role,
+        data_lines=[f"Marks: {marks}", total],
+        question=message,
+        optional_lines=per_month,
+    )
+
+
+def performance_prompt(records, message, role):
+    # records is fetch_student_data's text; keep only the "Subject: score" lines
+    marks = [
+        line.replace(": ", " ") for line in records.splitlines()
+        if ":" in line and not line.endswith(":")
+    ]
+    data = f"Marks: {', '.join(marks)}" if marks else records
+    return build("performance", role, data_lines=[data], question=message)
+
+
+def guard_prompt(reason, role):
+    # No user text: the reply depends only on (role, reason) and is cached on that
+    return build("guard", role, data_lines=[f"Reason: {reason}"])
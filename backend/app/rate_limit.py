@@ -0,0 +1,230 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from fastapi import Depends, HTTPException, Request, status
+
+from app import intent_router as intents
+from app import schemas
+from app.intent_router import RoutedMessage, route_chat
+from app.llm_guard import GUARD_USE_LLM
+
+# =====================================================
+# ⏱️ RATE LIMITING
+# Token buckets per student (per client IP when no student is
+# given), with a smaller budget for messages that end in an LLM
+# call. student_id comes from the client, so every request also
+# spends from a looser per-IP bucket that changing it can't dodge.
+# Checked before any DB or model work; overflow is a 429 with
+# Retry-After.
+# =====================================================
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# "memory" (per process) or "sqlite" (shared by every worker on the host)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "rate_limit.db")
+
+# Sustained requests per minute and burst size, per student bucket
+RATE_LIMIT_SQL_PER_MINUTE = float(os.getenv("RATE_LIMIT_SQL_PER_MINUTE", "60"))
+RATE_LIMIT_SQL_BURST = float(os.getenv("RATE_LIMIT_SQL_BURST", "20"))
+RATE_LIMIT_LLM_PER_MINUTE = float(os.getenv("RATE_LIMIT_LLM_PER_MINUTE", "10"))
+RATE_LIMIT_LLM_BURST = float(os.getenv("RATE_LIMIT_LLM_BURST", "5"))
+
+# Per client IP, for every request. Looser, since a school behind one
+# NAT address shares it.
+RATE_LIMIT_IP_SQL_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_SQL_PER_MINUTE", "600"))
+RATE_LIMIT_IP_SQL_BURST = float(os.getenv("RATE_LIMIT_IP_SQL_BURST", "100"))
+RATE_LIMIT_IP_LLM_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_LLM_PER_MINUTE", "60"))
+RATE_LIMIT_IP_LLM_BURST = float(os.getenv("RATE_LIMIT_IP_LLM_BURST", "20"))
+
+# Use the first X-Forwarded-For address (only behind a trusted proxy)
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes")
+
+LLM_INTENTS = {intents.PERFORMANCE, intents.ADVISOR}
+if GUARD_USE_LLM:
+    LLM_INTENTS.add(intents.GUARD)
+
+BUDGETS = {
+    "llm": (RATE_LIMIT_LLM_PER_MINUTE / 60, RATE_LIMIT_LLM_BURST),
+    "sql": (RATE_LIMIT_SQL_PER_MINUTE / 60, RATE_LIMIT_SQL_BURST),
+}
+IP_BUDGETS = {
+    "llm": (RATE_LIMIT_IP_LLM_PER_MINUTE / 60, RATE_LIMIT_IP_LLM_BURST),
+    "sql": (RATE_LIMIT_IP_SQL_PER_MINUTE / 60, RATE_LIMIT_IP_SQL_BURST),
+}
+
+
+def _refill(tokens, updated, rate, burst, now):
+    return min(burst, tokens + (now - updated) * rate)
+
+
+def _wait(tokens, rate):
+    # A zero rate never refills; ask for an hour rather than forever
+    return (1 - tokens) / rate if rate > 0 else 3600
+
+
+# =====================================================
+# 🧺 BACKENDS
+# take(limits) spends one token from every (key, rate, burst) bucket,
+# or none of them, and returns 0 or the seconds to wait before
+# retrying.
+# =====================================================
+
+class MemoryBuckets:
+    PRUNE_EVERY = 10000
+
+    def __init__(self):
+        self._buckets = {}   # key -> (tokens, updated)
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, limits):
+        now = time.monotonic()
+
+        with self._lock:
+            levels = {
+                key: _refill(*self._buckets.get(key, (burst, now)), rate, burst, now)
+                for key, rate, burst in limits
+            }
+
+            waits = [
+                _wait(levels[key], rate) for key, rate, _ in limits if levels[key] < 1
+            ]
+            if waits:
+                return max(waits)
+
+            for key, tokens in levels.items():
+                self._buckets[key] = (tokens - 1, now)
+
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                self._prune(now)
+
+        return 0
+
+    def _prune(self, now):
+        # A bucket idle long enough to be full again carries no state.
+        # Budgets differ per key, so wait out the slowest one.
+        idle = max(
+            (burst / rate if rate > 0 else math.inf
+             for budgets in (BUDGETS, IP_BUDGETS) for rate, burst in budgets.values()),
+            default=math.inf,
+        )
+        for key in [k for k, (_, updated) in self._buckets.items() if now - updated > idle]:
+            del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBuckets:
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=5, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def take(self, limits):
+        # Wall clock, since the buckets are shared between processes
+        now = time.time()
+        keys = [key for key, _, _ in limits]
+        marks = ",".join("?" * len(keys))
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                stored = dict(
+                    (key, (tokens, updated))
+                    for key, tokens, updated in self._conn.execute(
+                        f"SELECT key, tokens, updated FROM rate_limit WHERE key IN ({marks})",
+                        keys
+                    )
+                )
+                levels = {
+                    key: _refill(*stored.get(key, (burst, now)), rate, burst, now)
+                    for key, rate, burst in limits
+                }
+
+                waits = [
+                    _wait(levels[key], rate) for key, rate, _ in limits if levels[key] < 1
+                ]
+                if waits:
+                    self._conn.execute("ROLLBACK")
+                    return max(waits)
+
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rate_limit VALUES (?, ?, ?)",
+                    [(key, tokens - 1, now) for key, tokens in levels.items()]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return 0
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM rate_limit")
+
+
+def _make_backend():
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBuckets(RATE_LIMIT_DB_PATH)
+    return MemoryBuckets()
+
+
+buckets = _make_backend()
+
+
+# =====================================================
+# 🚪 FASTAPI DEPENDENCY
+# =====================================================
+
+def client_ip(http_request: Request):
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = http_request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return http_request.client.host if http_request.client else "unknown"
+
+
+def budget_for(intent):
+    return "llm" if intent in LLM_INTENTS else "sql"
+
+
+def chat_rate_limit(
+    request: schemas.ChatRequest,
+    http_request: Request,
+    routed: RoutedMessage = Depends(route_chat),
+):
+    if not RATE_LIMIT_ENABLED:
+        return
+
+    budget = budget_for(routed.route.intent)
+    ip = client_ip(http_request)
+
+    if request.student_id is not None:
+        own = f"{budget}:student:{request.student_id}"
+    else:
+        own = f"{budget}:anonymous:{ip}"
+
+    retry_after = buckets.take([
+        (own, *BUDGETS[budget]),
+        (f"{budget}:ip:{ip}", *IP_BUDGETS[budget]),
+    ])
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests. Please slow down and try again shortly.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
@@ -0,0 +1,353 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, exists, func, select, text, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.history import bot_reply_column
+from app.models import ChatHistory, ReplyTemplate
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# 🧹 CHAT HISTORY RETENTION
+# One run:
+#   1. archive rows older than their role's TTL to gzip NDJSON,
+#      one directory per day, then delete them in batches
+#   2. compact: replies stored many times move to reply_template
+#      and the rows keep only its id
+#   3. drop templates nothing points at any more
+# Run it from the CLI or let the app schedule it (off by default).
+#
+#   python -m app.retention run [--dry-run] [--vacuum]
+# =====================================================
+
+# Days to keep chat rows, per role; "default" covers every other role
+CHAT_RETENTION_DAYS = os.getenv("CHAT_RETENTION_DAYS", "default:365")
+
+CHAT_ARCHIVE_DIR = os.getenv("CHAT_ARCHIVE_DIR", "./archive/chat_history")
+CHAT_RETENTION_BATCH = int(os.getenv("CHAT_RETENTION_BATCH", "1000"))
+
+# A reply seen this many times becomes a template
+CHAT_DEDUP_MIN_REPEATS = int(os.getenv("CHAT_DEDUP_MIN_REPEATS", "3"))
+
+# Hours between scheduled runs inside the app; 0 disables the schedule
+CHAT_RETENTION_INTERVAL_HOURS = float(os.getenv("CHAT_RETENTION_INTERVAL_HOURS", "0"))
+
+
+def parse_ttls(spec):
+    """'student:180,parent:365,default:365' -> {"student": 180, ...}"""
+    ttls = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        role, days = part.split(":")
+        ttls[role.strip().lower()] = int(days)
+    return ttls
+
+
+# =====================================================
+# 📦 ARCHIVE + DELETE
+# =====================================================
+
+def _archive_row(row):
+    return {
+        "id": row.id,
+        "student_id": row.student_id,
+        "role": row.role,
+        "user_message": row.user_message,
+        "bot_reply": row.bot_reply,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+    }
+
+
+def _write_archive(archive_dir, run_id, rows):
+    """Append rows to <dir>/date=YYYY-MM-DD/part-<run_id>.ndjson.gz; returns bytes written."""
+    by_day = {}
+    for row in rows:
+        day = row.timestamp.date().isoformat() if row.timestamp else "unknown"
+        by_day.setdefault(day, []).append(row)
+
+    written = 0
+    for day, day_rows in by_day.items():
+        folder = os.path.join(archive_dir, f"date={day}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"part-{run_id}.ndjson.gz")
+
+        before = os.path.getsize(path) if os.path.exists(path) else 0
+        # Each append is a complete gzip member; gzip readers concatenate them
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            for row in day_rows:
+                f.write(json.dumps(_archive_row(row), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        written += os.path.getsize(path) - before
+
+    return written
+
+
+def _expired(role_filter, cutoff, after_id, limit):
+    return (
+        select(
+            ChatHistory.id,
+            ChatHistory.student_id,
+            ChatHistory.role,
+            ChatHistory.user_message,
+            bot_reply_column().label("bot_reply"),
+            ChatHistory.timestamp,
+        )
+        .outerjoin(ReplyTemplate, ReplyTemplate.id == ChatHistory.reply_template_id)
+        .where(ChatHistory.id > after_id, ChatHistory.timestamp < cutoff, role_filter)
+        # Walk the primary key; ids grow with time, so no timestamp index is needed
+        .order_by(ChatHistory.id)
+        .limit(limit)
+    )
+
+
+def purge_expired(db: Session, ttls, now=None, archive_dir=CHAT_ARCHIVE_DIR,
+                  batch=CHAT_RETENTION_BATCH, dry_run=False):
+    now = now or datetime.utcnow()
+    run_id = now.strftime("%Y%m%dT%H%M%S")
+    role = func.lower(ChatHistory.role)
+    named = [r for r in ttls if r != "default"]
+
+    filters = [(r, role == r, ttls[r]) for r in named]
+    if "default" in ttls:
+        filters.append(("default", role.notin_(named), ttls["default"]))
+
+    report = {"deleted": {}, "archive_bytes": 0}
+
+    for name, role_filter, days in filters:
+        cutoff = now - timedelta(days=days)
+
+        if dry_run:
+            report["deleted"][name] = db.query(func.count(ChatHistory.id)).filter(
+                ChatHistory.timestamp < cutoff, role_filter
+            ).scalar()
+            continue
+
+        deleted, after_id = 0, 0
+        while True:
+            rows = db.execute(_expired(role_filter, cutoff, after_id, batch)).all()
+            if not rows:
+                break
+
+            # Archive first: a crash between the two leaves rows archived twice, never lost
+            report["archive_bytes"] += _write_archive(archive_dir, run_id, rows)
+
+            ids = [r.id for r in rows]
+            db.execute(delete(ChatHistory).where(ChatHistory.id.in_(ids)))
+            db.commit()
+
+            deleted += len(ids)
+            after_id = ids[-1]
+
+        report["deleted"][name] = deleted
+
+    return report
+
+
+# =====================================================
+# 🗜️ REPLY DEDUPLICATION
+# =====================================================
+
+def _template_id(db: Session, reply):
+    digest = hashlib.sha256(reply.encode("utf-8")).hexdigest()
+    template_id = db.query(ReplyTemplate.id).filter(
+        ReplyTemplate.text_hash == digest
+    ).scalar()
+    if template_id is None:
+        template = ReplyTemplate(text_hash=digest, text=reply)
+        db.add(template)
+        db.flush()
+        template_id = template.id
+    return template_id
+
+
+def compact_replies(db: Session, min_repeats=CHAT_DEDUP_MIN_REPEATS, dry_run=False):
+    uncompacted = (ChatHistory.reply_template_id.is_(None), ChatHistory.bot_reply != "")
+
+    repeated = db.query(
+        ChatHistory.bot_reply, func.count(ChatHistory.id)
+    ).filter(*uncompacted).group_by(
+        ChatHistory.bot_reply
+    ).having(func.count(ChatHistory.id) >= min_repeats).all()
+
+    report = {"templates": len(repeated), "rows": 0, "bytes": 0}
+    if dry_run:
+        report["rows"] = sum(n for _, n in repeated)
+        report["bytes"] = sum(len(r.encode("utf-8")) * n for r, n in repeated)
+        return report
+
+    for reply, count in repeated:
+        template_id = _template_id(db, reply)
+        db.execute(
+            update(ChatHistory)
+            .where(*uncompacted, ChatHistory.bot_reply == reply)
+            .values(reply_template_id=template_id, bot_reply="")
+        )
+        db.commit()
+        report["rows"] += count
+        report["bytes"] += len(reply.encode("utf-8")) * count
+
+    # Later copies of replies that already have a template
+    matching = select(ReplyTemplate.id).where(
+        ReplyTemplate.text == ChatHistory.bot_reply
+    ).scalar_subquery()
+    late = db.execute(
+        update(ChatHistory)
+        .where(*uncompacted, exists().where(ReplyTemplate.text == ChatHistory.bot_reply))
+        # Template id first: MySQL applies SET clauses left to right
+        .ordered_values(
+            (ChatHistory.reply_template_id, matching), (ChatHistory.bot_reply, "")
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    report["rows"] += late
+
+    return report
+
+
+def drop_unused_templates(db: Session):
+    used = select(ChatHistory.id).where(
+        ChatHistory.reply_template_id == ReplyTemplate.id
+    ).exists()
+    dropped = db.execute(
+        delete(ReplyTemplate).where(~used).execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return dropped
+
+
+# =====================================================
+# 📏 SPACE
+# =====================================================
+
+def database_bytes(db: Session):
+    """Bytes in use by the database (SQLite) or chat tables (Postgres); None if unknown."""
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        page_size = db.execute(text("PRAGMA page_size")).scalar()
+        pages = db.execute(text("PRAGMA page_count")).scalar()
+        free = db.execute(text("PRAGMA freelist_count")).scalar()
+        return (pages - free) * page_size
+
+    if dialect == "postgresql":
+        return db.execute(text(
+            "SELECT pg_total_relation_size('chat_history') "
+            "+ pg_total_relation_size('reply_template')"
+        )).scalar()
+
+    return None
+
+
+def vacuum(db: Session):
+    """Return freed pages to the filesystem (SQLite only)."""
+    if db.get_bind().dialect.name != "sqlite":
+        return False
+    db.commit()
+    with db.get_bind().connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+    return True
+
+
+def run(db: Session, ttls=None, dry_run=False, vacuum_after=False, now=None):
+    ttls = ttls if ttls is not None else parse_ttls(CHAT_RETENTION_DAYS)
+    started = time.perf_counter()
+    before = database_bytes(db)
+
+    purged = purge_expired(db, ttls, now=now, dry_run=dry_run)
+    compacted = compact_replies(db, dry_run=dry_run)
+    dropped = 0 if dry_run else drop_unused_templates(db)
+    vacuumed = vacuum(db) if vacuum_after and not dry_run else False
+
+    after = database_bytes(db)
+    return {
+        "dry_run": dry_run,
+        "ttl_days": ttls,
+        "deleted": purged["deleted"],
+        "archive_bytes": purged["archive_bytes"],
+        "compacted_rows": compacted["rows"],
+        "compacted_reply_bytes": compacted["bytes"],
+        "templates_used": compacted["templates"],
+        "dropped_templates": dropped,
+        "vacuumed": vacuumed,
+        "db_bytes_before": before,
+        "db_bytes_after": after,
+        "reclaimed_bytes": before - after if before is not None and after is not None else None,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def run_once(**kwargs):
+    db = SessionLocal()
+    try:
+        return run(db, **kwargs)
+    finally:
+        db.close()
+
+
+# =====================================================
+# ⏰ SCHEDULE
+# =====================================================
+
+class RetentionSchedule:
+    def __init__(self, interval_hours):
+        self.interval = interval_hours * 3600
+        self.last_report = None
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.last_report = await asyncio.to_thread(run_once)
+                logger.info("chat retention: %s", json.dumps(self.last_report))
+            except Exception:
+                logger.exception("chat retention run failed")
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+schedule = RetentionSchedule(CHAT_RETENTION_INTERVAL_HOURS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat history retention")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--dry-run", action="store_true", help="count only, change nothing")
+    parser.add_argument("--vacuum", action="store_true", help="SQLite: VACUUM afterwards")
+    parser.add_argument("--ttl", help="override CHAT_RETENTION_DAYS, e.g. student:180,default:365")
+    args = parser.parse_args()
+
+    report = run_once(
+        ttls=parse_ttls(args.ttl) if args.ttl else None,
+        dry_run=args.dry_run,
+        vacuum_after=args.vacuum,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
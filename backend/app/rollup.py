@@ -0,0 +1,221 @@
+"""
+Monthly attendance rollup: one attendance_rollup row per student and
+month, holding present/absent/total counts. Every attendance write
+updates it in the same transaction; `rebuild` recomputes it from the
+raw attendance table.
+
+    python -m app.rollup rebuild [--student 12]
+"""
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import Integer, and_, case, cast, extract, func, insert, select, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import Attendance, AttendanceRollup
+
+
+def _counts(status):
+    """(present, absent, total) contribution of one attendance row."""
+    s = (status or "").strip().lower()
+    return int(s == "present"), int(s == "absent"), 1
+
+
+class Deltas:
+    """Accumulates count changes per (student_id, year, month)."""
+
+    def __init__(self):
+        self._changes = defaultdict(lambda: [0, 0, 0])
+
+    def change(self, student_id, day, old_status=None, new_status=None):
+        delta = self._changes[(student_id, day.year, day.month)]
+        if old_status is not None:
+            for i, n in enumerate(_counts(old_status)):
+                delta[i] -= n
+        if new_status is not None:
+            for i, n in enumerate(_counts(new_status)):
+                delta[i] += n
+
+    def items(self):
+        return [(key, d) for key, d in self._changes.items() if any(d)]
+
+
+# =====================================================
+# ✍️ INCREMENTAL UPDATES (caller commits)
+# =====================================================
+
+def _bump(db: Session, student_id, year, month, present, absent, total):
+    return db.execute(
+        update(AttendanceRollup)
+        .where(
+            AttendanceRollup.student_id == student_id,
+            AttendanceRollup.year == year,
+            AttendanceRollup.month == month,
+        )
+        .values(
+            present=AttendanceRollup.present + present,
+            absent=AttendanceRollup.absent + absent,
+            total=AttendanceRollup.total + total,
+        )
+    ).rowcount
+
+
+def apply(db: Session, deltas: Deltas):
+    for (student_id, year, month), (present, absent, total) in deltas.items():
+        if _bump(db, student_id, year, month, present, absent, total):
+            continue
+
+        try:
+            with db.begin_nested():
+                db.execute(insert(AttendanceRollup).values(
+                    student_id=student_id, year=year, month=month,
+                    present=present, absent=absent, total=total,
+                ))
+        except IntegrityError:
+            # Another writer created the month first
+            _bump(db, student_id, year, month, present, absent, total)
+
+
+def record_attendance(db: Session, student_id, day, old_status, new_status):
+    """One attendance row added (old_status None) or changed."""
+    deltas = Deltas()
+    deltas.change(student_id, day, old_status, new_status)
+    apply(db, deltas)
+
+
+def record_bulk(db: Session, rows):
+    """
+    rows: [{"student_id", "date", "status"}] about to be upserted.
+    Reads the statuses they replace, so call it before the upsert.
+    """
+    if not rows:
+        return
+
+    existing = {
+        (sid, day): status
+        for sid, day, status in db.query(
+            Attendance.student_id, Attendance.date, Attendance.status
+        ).filter(
+            Attendance.student_id.in_({r["student_id"] for r in rows}),
+            Attendance.date.in_({r["date"] for r in rows}),
+        )
+    }
+
+    deltas = Deltas()
+    for r in rows:
+        deltas.change(
+            r["student_id"], r["date"],
+            existing.get((r["student_id"], r["date"])), r["status"]
+        )
+    apply(db, deltas)
+
+
+def forget_student(db: Session, student_id):
+    db.query(AttendanceRollup).filter(
+        AttendanceRollup.student_id == student_id
+    ).delete(synchronize_session=False)
+
+
+# =====================================================
+# 🔁 FULL REBUILD
+# =====================================================
+
+def rebuild(db: Session, student_ids=None):
+    """Recompute rollup rows from raw attendance (all students by default)."""
+    status = func.lower(func.trim(Attendance.status))
+    year = cast(extract("year", Attendance.date), Integer)
+    month = cast(extract("month", Attendance.date), Integer)
+
+    source = select(
+        Attendance.student_id,
+        year,
+        month,
+        func.sum(case((status == "present", 1), else_=0)),
+        func.sum(case((status == "absent", 1), else_=0)),
+        func.count(Attendance.id),
+    ).group_by(Attendance.student_id, year, month)
+
+    stale = db.query(AttendanceRollup)
+    if student_ids is not None:
+        ids = list(student_ids)
+        source = source.where(Attendance.student_id.in_(ids))
+        stale = stale.filter(AttendanceRollup.student_id.in_(ids))
+
+    stale.delete(synchronize_session=False)
+    db.execute(insert(AttendanceRollup).from_select(
+        ["student_id", "year", "month", "present", "absent", "total"], source
+    ))
+
+
+def mismatches(db: Session):
+    """
+    (student_id, year, month) of every month where the rollup and a fresh
+    count disagree, including months missing from either side; empty when
+    in step.
+    """
+    status = func.lower(func.trim(Attendance.status))
+    year = cast(extract("year", Attendance.date), Integer)
+    month = cast(extract("month", Attendance.date), Integer)
+
+    fresh = select(
+        Attendance.student_id.label("student_id"),
+        year.label("year"),
+        month.label("month"),
+        func.sum(case((status == "present", 1), else_=0)).label("present"),
+        func.sum(case((status == "absent", 1), else_=0)).label("absent"),
+        func.count(Attendance.id).label("total"),
+    ).group_by(Attendance.student_id, year, month).subquery()
+
+    same_month = and_(
+        AttendanceRollup.student_id == fresh.c.student_id,
+        AttendanceRollup.year == fresh.c.year,
+        AttendanceRollup.month == fresh.c.month,
+    )
+
+    # A full outer join as two left joins, since MySQL has no FULL JOIN
+    counted = (
+        select(fresh.c.student_id, fresh.c.year, fresh.c.month)
+        .outerjoin(AttendanceRollup, same_month)
+        .where(
+            (AttendanceRollup.total.is_(None))
+            | (AttendanceRollup.total != fresh.c.total)
+            | (AttendanceRollup.present != fresh.c.present)
+            | (AttendanceRollup.absent != fresh.c.absent)
+        )
+    )
+    orphaned = (
+        select(AttendanceRollup.student_id, AttendanceRollup.year, AttendanceRollup.month)
+        .outerjoin(fresh, same_month)
+        .where(fresh.c.total.is_(None))
+    )
+
+    return sorted(tuple(r) for r in db.execute(union_all(counted, orphaned)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attendance rollup maintenance")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--student", type=int, action="append",
+                        help="limit a rebuild to these student ids")
+    args = parser.parse_args()
+
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            rebuild(db, args.student)
+            db.commit()
+            print("Attendance rollup rebuilt")
+        else:
+            bad = mismatches(db)
+            print(f"{len(bad)} rollup month(s) out of step")
+            for row in bad[:20]:
+                print("  student {} {}-{:02d}".format(*row))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional,List
-from datetime import datetime
+from datetime import datetime, date
 
 class ChatRequest(BaseModel):
     message: str
@@ -12,6 +12,36 @@ class ChatResponse(BaseModel):
     reply: str
 
 class ChatHistoryResponse(BaseModel):
+    role: str
     user_message: str
     bot_reply: str
-    timestamp: datetime
\ No newline at end of file
+    timestamp: datetime
+
+
+class ChatHistoryPage(BaseModel):
+    items: List[ChatHistoryResponse]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for older messages
+
+
+# Bulk admin imports
+class AttendanceRow(BaseModel):
+    student_id: int
+    date: date
+    status: str  # Present / Absent
+
+
+class MarksRow(BaseModel):
+    student_id: int
+    subject: str
+    score: int
+
+
+class BulkRowError(BaseModel):
+    row: int  # 1-based position in the uploaded data
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    received: int
+    written: int
+    errors: List[BulkRowError]
@@ -1,10 +1,148 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import extract
-from datetime import date, datetime
-from calendar import monthrange
+from datetime import date, datetime, timedelta
+import os
+import threading
+
+from app.models import Attendance, Master
+from app.stats import (
+    attendance_counts,
+    subject_marks,
+    monthly_attendance,
+    attendance_since,
+)
+from app.time_parser import attendance_window, month_window, window_criteria
+from app.cache import LRUCache
+from app.database import SessionLocal, engine, read_engine
+from app import llm_cache
 
-from app.models import Academics, Attendance, Master, ChatHistory
-from app.llm import call_llm
+
+# =====================================================
+# 🗃️ STUDENT SNAPSHOT
+# Compact per-student aggregates shared by every chat intent.
+# Admin writes invalidate it; the TTL bounds staleness when
+# several workers each hold their own copy. Built from the
+# primary, so a lagging replica is never cached.
+# =====================================================
+
+STUDENT_SNAPSHOT_SIZE = int(os.getenv("STUDENT_SNAPSHOT_SIZE", "1024"))
+STUDENT_SNAPSHOT_TTL = float(os.getenv("STUDENT_SNAPSHOT_TTL", "300"))  # seconds
+SNAPSHOT_RECENT_DAYS = int(os.getenv("SNAPSHOT_RECENT_DAYS", "60"))
+
+_snapshots = LRUCache(maxsize=STUDENT_SNAPSHOT_SIZE, ttl=STUDENT_SNAPSHOT_TTL)
+
+# Bumped by every invalidation, so a build that read the rows before
+# an admin write doesn't store what it read once that write lands
+_generations = {}   # student_id -> int
+_generations_lock = threading.Lock()
+
+
+def build_student_snapshot(db: Session, student_id: int):
+    exists = db.query(Master.id).filter(Master.id == student_id).first() is not None
+    if not exists:
+        return {"exists": False}
+
+    since = date.today() - timedelta(days=SNAPSHOT_RECENT_DAYS)
+
+    return {
+        "exists": True,
+        "marks": [
+            {"subject": subject, "score": score}
+            for subject, score in subject_marks(db, student_id)
+        ],
+        "attendance_by_month": {
+            (int(year), int(month)): {
+                "total": total, "present": present or 0, "absent": absent or 0
+            }
+            for year, month, total, present, absent
+            in monthly_attendance(db, student_id)
+        },
+        "recent_since": since,
+        "recent_attendance": dict(attendance_since(db, student_id, since)),
+    }
+
+
+def get_student_snapshot(db: Session, student_id: int):
+    snapshot = _snapshots.get(student_id)
+    if snapshot is not None:
+        return snapshot
+
+    generation = _generations.get(student_id, 0)
+
+    if read_engine is engine:
+        snapshot = build_student_snapshot(db, student_id)
+    else:
+        with SessionLocal() as primary:
+            snapshot = build_student_snapshot(primary, student_id)
+
+    with _generations_lock:
+        if _generations.get(student_id, 0) == generation:
+            _snapshots.set(student_id, snapshot)
+    return snapshot
+
+
+def invalidate_students(student_ids):
+    """
+    Call after any write to students' master, marks or attendance rows.
+    Blocking (the reply cache may be on disk), so async code runs it
+    through run_db.
+    """
+    student_ids = set(student_ids)
+    with _generations_lock:
+        # Bump before popping: a build that checked the old generation
+        # has then either stored its snapshot already or won't store it
+        for student_id in student_ids:
+            _generations[student_id] = _generations.get(student_id, 0) + 1
+            _snapshots.pop(student_id)
+    llm_cache.invalidate_students(student_ids)
+
+
+def invalidate_student(student_id: int):
+    invalidate_students([student_id])
+
+
+def _snapshot_counts(snapshot, window):
+    """(total, present) for a window, or None if the snapshot can't tell."""
+    months = snapshot["attendance_by_month"]
+
+    if window is None:
+        selected = months.values()
+    elif window[0].day == 1 and window[1].day == 1:
+        start, end = window
+        selected = [
+            counts for (year, month), counts in months.items()
+            if start <= date(year, month, 1) < end
+        ]
+    elif window[0] >= snapshot["recent_since"]:
+        start, end = window
+        statuses = [
+            status for day, status in snapshot["recent_attendance"].items()
+            if start <= day < end
+        ]
+        present = sum(1 for s in statuses if s.strip().lower() == "present")
+        return len(statuses), present
+    else:
+        return None
+
+    return (
+        sum(c["total"] for c in selected),
+        sum(c["present"] for c in selected)
+    )
+
+
+def _attendance_totals(db, student_id, window):
+    snapshot = get_student_snapshot(db, student_id)
+    if not snapshot["exists"]:
+        return 0, 0
+
+    counts = _snapshot_counts(snapshot, window)
+
+    if counts is None:
+        total, present, _ = attendance_counts(
+            db, student_id, *window_criteria(Attendance.date, window)
+        )
+        return total, present
+
+    return counts
 
 
 # =====================================================
@@ -12,7 +150,7 @@ from app.llm import call_llm
 # =====================================================
 
 def validate_student(db: Session, student_id: int):
-    return db.query(Master).filter(Master.id == student_id).first()
+    return get_student_snapshot(db, student_id)["exists"]
 
 
 # =====================================================
@@ -25,15 +163,20 @@ def fetch_attendance_by_date(db, student_id: int, date_str: str):
     except ValueError:
         return "Invalid date format. Please use YYYY-MM-DD."
 
-    record = db.query(Attendance).filter(
-        Attendance.student_id == student_id,
-        Attendance.date == target_date
-    ).first()
+    snapshot = get_student_snapshot(db, student_id)
 
-    if not record:
+    if snapshot["exists"] and target_date >= snapshot["recent_since"]:
+        status = snapshot["recent_attendance"].get(target_date)
+    else:
+        status = db.query(Attendance.status).filter(
+            Attendance.student_id == student_id,
+            Attendance.date == target_date
+        ).scalar()
+
+    if not status:
         return f"No attendance record found for {date_str}."
 
-    return f"On {date_str}, you were marked **{record.status}**."
+    return f"On {date_str}, you were marked **{status}**."
 
 
 # =====================================================
@@ -41,28 +184,21 @@ def fetch_attendance_by_date(db, student_id: int, date_str: str):
 # =====================================================
 
 def fetch_attendance_summary(db, student_id: int, month=None, year=None):
-    query = db.query(Attendance).filter(
-        Attendance.student_id == student_id
+    label = f"{month}/{year}" if month else str(year)
+    return summarize_attendance(
+        db, student_id, attendance_window(month, year), label
     )
 
-    if year:
-        query = query.filter(extract("year", Attendance.date) == year)
 
-    if month:
-        query = query.filter(extract("month", Attendance.date) == month)
+def summarize_attendance(db, student_id: int, window, label: str):
+    total, present = _attendance_totals(db, student_id, window)
 
-    records = query.all()
-
-    if not records:
+    if not total:
         return "No attendance records found."
 
-    total = len(records)
-    present = sum(1 for r in records if r.status.lower() == "present")
     absent = total - present
     percentage = round((present / total) * 100, 2)
 
-    label = f"{month}/{year}" if month else str(year)
-
     return (
         f"Attendance Summary ({label}):\n"
         f"Total days recorded: {total}\n"
@@ -77,14 +213,12 @@ def fetch_attendance_summary(db, student_id: int, month=None, year=None):
 # =====================================================
 
 def fetch_average_score(db, student_id: int):
-    records = db.query(Academics).filter(
-        Academics.student_id == student_id
-    ).all()
+    marks = get_student_snapshot(db, student_id).get("marks")
 
-    if not records:
+    if not marks:
         return "No academic records found."
 
-    avg = round(sum(r.score for r in records) / len(records), 2)
+    avg = round(sum(m["score"] for m in marks) / len(marks), 2)
     return f"Your average score is **{avg}**."
 
 
@@ -100,30 +234,19 @@ def fetch_student_data(db: Session, message: str, student_id: int, month=None, y
 
     # ---------- ATTENDANCE ----------
     if "attendance" in msg:
-        query = db.query(Attendance).filter(
-            Attendance.student_id == student_id
-        )
-
-        if month and year:
-            start = date(year, month, 1)
-            end = date(year, month, monthrange(year, month)[1])
-            query = query.filter(
-                Attendance.date >= start,
-                Attendance.date <= end
-            )
+        window = month_window(year, month) if month and year else None
 
-        records = query.all()
-        if not records:
+        total, present = _attendance_totals(db, student_id, window)
+        if not total:
             return "No attendance records found."
 
-        present = sum(1 for r in records if r.status.lower() == "present")
-        percentage = round((present / len(records)) * 100, 2)
+        percentage = round((present / total) * 100, 2)
 
         return (
             f"Attendance Summary:\n"
-            f"Total days recorded: {len(records)}\n"
+            f"Total days recorded: {total}\n"
             f"Days present: {present}\n"
-            f"Days absent: {len(records) - present}\n"
+            f"Days absent: {total - present}\n"
             f"Attendance percentage: {percentage}%"
         )
 
@@ -132,16 +255,14 @@ def fetch_student_data(db: Session, message: str, student_id: int, month=None, y
         "mark", "marks", "score", "result",
         "math", "science", "english", "history"
     ]):
-        records = db.query(Academics).filter(
-            Academics.student_id == student_id
-        ).all()
+        records = get_student_snapshot(db, student_id)["marks"]
 
         if not records:
             return "No academic records found."
 
         return "\n".join(
             ["Academic Records:"] +
-            [f"{r.subject}: {r.score}" for r in records]
+            [f"{r['subject']}: {r['score']}" for r in records]
         )
 
     return "No matching academic data found."
@@ -152,16 +273,14 @@ def fetch_student_data(db: Session, message: str, student_id: int, month=None, y
 # =====================================================
 
 def get_strongest_and_weakest_subject(db, student_id: int):
-    records = db.query(Academics).filter(
-        Academics.student_id == student_id
-    ).all()
+    marks = get_student_snapshot(db, student_id).get("marks")
 
-    if not records:
+    if not marks:
         return None, None
 
-    scores = {r.subject: r.score for r in records}
-    strongest = max(scores, key=scores.get)
-    weakest = min(scores, key=scores.get)
+    # max/min keep the first of equal scores, i.e. the oldest row
+    strongest = max(marks, key=lambda m: m["score"])["subject"]
+    weakest = min(marks, key=lambda m: m["score"])["subject"]
 
     return strongest, weakest
 
@@ -170,65 +289,44 @@ def get_strongest_and_weakest_subject(db, student_id: int):
 # 🧠 AI SCHOOL ADVISOR (FIXED — NO HALLUCINATIONS)
 # =====================================================
 
-def generate_smart_school_reply(db, student_id, role, message):
-    marks = db.query(Academics).filter(
-        Academics.student_id == student_id
-    ).all()
-
-    attendance = db.query(Attendance).filter(
-        Attendance.student_id == student_id
-    ).all()
-
-    if not marks and not attendance:
-        return "No academic data available to generate suggestions."
-
-    marks_summary = [f"{m.subject}: {m.score}" for m in marks]
-
-    total_days = len(attendance)
-    present_days = sum(1 for a in attendance if a.status.lower() == "present")
-    attendance_pct = (
-        round((present_days / total_days) * 100, 2)
-        if total_days > 0 else "N/A"
-    )
-
-    prompt = f"""
-You are a SCHOOL ACADEMIC ADVISOR.
-
-Student question:
-"{message}"
-
-ACADEMIC DATA (ONLY SOURCE OF TRUTH):
-
-Marks:
-{marks_summary}
-
-Attendance:
-Total days: {total_days}
-Days present: {present_days}
-Attendance percentage: {attendance_pct}
-
-STRICT RULES:
-- Talk ONLY about academics (marks, subjects, attendance, study habits)
-- Do NOT mention politics, voting, news, or unrelated topics
-- Do NOT invent ranks, trends, or external examples
-- Give practical study improvement suggestions
-- Keep response short (5–7 bullet points max)
-
-Now respond.
-"""
-
-    return call_llm(prompt, role)
-
-
-# =====================================================
-# 💬 CHAT HISTORY
-# =====================================================
-
-def save_chat(db, role, message, reply, student_id=None):
-    db.add(ChatHistory(
-        role=role,
-        user_message=message,
-        bot_reply=reply,
-        student_id=student_id
-    ))
-    db.commit()
+def fetch_advisor_data(db, student_id):
+    """Everything the advisor prompt uses; also the LLM cache fingerprint."""
+    snapshot = get_student_snapshot(db, student_id)
+    if not snapshot["exists"]:
+        return None
+
+    marks = snapshot["marks"]
+    total_days, present_days = _snapshot_counts(snapshot, None)
+
+    if not marks and not total_days:
+        return None
+
+    return {
+        "marks": [f"{m['subject']}: {m['score']}" for m in marks],
+        "total_days": total_days,
+        "present_days": present_days,
+        "months": [
+            (year, month, c["present"], c["total"])
+            for (year, month), c in sorted(snapshot["attendance_by_month"].items())
+        ],
+    }
+
+
+def build_advisor_fallback(data):
+    """Deterministic advisor reply, used when the LLM is overloaded."""
+    total_days = data["total_days"]
+    present_days = data["present_days"]
+
+    lines = ["Here is a summary of your academic record:", ""]
+    lines.extend(f"- {mark}" for mark in data["marks"])
+
+    if total_days > 0:
+        pct = round((present_days / total_days) * 100, 2)
+        lines.append(f"- Attendance: {present_days}/{total_days} days ({pct}%)")
+
+    lines += [
+        "",
+        "Personalised suggestions are not available right now. "
+        "Please ask again in a few minutes.",
+    ]
+    return "\n".join(lines)
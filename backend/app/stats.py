@@ -0,0 +1,73 @@
+from typing import NamedTuple
+
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+
+from app.models import Academics, Attendance, AttendanceRollup
+
+# =====================================================
+# 📐 SHARED STATISTICS QUERIES
+# Aggregates run in SQL and come back as plain tuples,
+# so no ORM objects are built for counting or averaging.
+# =====================================================
+
+_status = func.lower(func.trim(Attendance.status))
+
+
+class AttendanceCounts(NamedTuple):
+    total: int
+    present: int
+    absent: int
+
+
+def attendance_counts(db: Session, student_id: int, *criteria) -> AttendanceCounts:
+    total, present, absent = db.query(
+        func.count(Attendance.id),
+        func.sum(case((_status == "present", 1), else_=0)),
+        func.sum(case((_status == "absent", 1), else_=0)),
+    ).filter(
+        Attendance.student_id == student_id,
+        *criteria
+    ).one()
+
+    return AttendanceCounts(total, present or 0, absent or 0)
+
+
+def rollup_counts(db: Session, student_id: int) -> AttendanceCounts:
+    """All-time counts from the monthly rollup instead of raw rows."""
+    total, present, absent = db.query(
+        func.sum(AttendanceRollup.total),
+        func.sum(AttendanceRollup.present),
+        func.sum(AttendanceRollup.absent),
+    ).filter(
+        AttendanceRollup.student_id == student_id
+    ).one()
+
+    return AttendanceCounts(total or 0, present or 0, absent or 0)
+
+
+def subject_marks(db: Session, student_id: int):
+    return db.query(Academics.subject, Academics.score).filter(
+        Academics.student_id == student_id
+    ).order_by(Academics.id).all()
+
+
+def monthly_attendance(db: Session, student_id: int):
+    """[(year, month, total, present, absent)] for every month with records."""
+    return db.query(
+        AttendanceRollup.year,
+        AttendanceRollup.month,
+        AttendanceRollup.total,
+        AttendanceRollup.present,
+        AttendanceRollup.absent,
+    ).filter(
+        AttendanceRollup.student_id == student_id,
+        AttendanceRollup.total > 0
+    ).all()
+
+
+def attendance_since(db: Session, student_id: int, since):
+    return db.query(Attendance.date, Attendance.status).filter(
+        Attendance.student_id == student_id,
+        Attendance.date >= since
+    ).all()
@@ -1,5 +1,8 @@
 import re
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from calendar import monthrange
+
+from app.intent import TIME_PATTERNS
 
 CURRENT_YEAR = datetime.now().year
 
@@ -41,3 +44,98 @@ def extract_month_year(msg: str):
     # ---------------- NO MONTH FOUND ----------------
     # Important: DO NOT mark invalid yet
     return None, year
+
+
+# ---------------- DATE WINDOWS ----------------
+# Half-open [start, end) ranges so attendance filters compare the raw
+# date column and stay index seeks (no extract()/cast() on the column).
+
+# Phrases come from intent.TIME_PATTERNS; one label per period it names
+PERIOD_LABELS = {
+    "today": "today",
+    "yesterday": "yesterday",
+    "week": "this week",
+    "last_week": "last week",
+    "month": "this month",
+    "last_month": "last month",
+    "year": "this year",
+    "last_year": "last year",
+}
+
+
+def day_window(day: date):
+    return day, day + timedelta(days=1)
+
+
+def month_window(year: int, month: int):
+    start = date(year, month, 1)
+    end = date(year, month, monthrange(year, month)[1]) + timedelta(days=1)
+    return start, end
+
+
+def year_window(year: int):
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def week_window(day: date):
+    # Weeks start on Monday
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=7)
+
+
+def attendance_window(month=None, year=None):
+    """Window for a parsed month/year request; None means all time."""
+    if month and year:
+        return month_window(year, month)
+    if year:
+        return year_window(year)
+    return None
+
+
+def inclusive_window(start=None, end=None):
+    """Window for user-supplied from/to dates (both inclusive, both optional)."""
+    if start is None and end is None:
+        return None
+    return (
+        start or date.min,
+        end + timedelta(days=1) if end else date.max
+    )
+
+
+def relative_window(period: str, today=None):
+    today = today or date.today()
+
+    if period == "today":
+        return day_window(today)
+    if period == "yesterday":
+        return day_window(today - timedelta(days=1))
+    if period == "week":
+        return week_window(today)
+    if period == "last_week":
+        return week_window(today - timedelta(days=7))
+    if period == "month":
+        return month_window(today.year, today.month)
+    if period == "last_month":
+        last = today.replace(day=1) - timedelta(days=1)
+        return month_window(last.year, last.month)
+    if period == "year":
+        return year_window(today.year)
+    if period == "last_year":
+        return year_window(today.year - 1)
+
+    raise ValueError(f"Unknown period: {period}")
+
+
+def extract_relative_period(msg: str):
+    msg = msg.lower()
+    for pattern, period in TIME_PATTERNS.items():
+        if re.search(pattern, msg):
+            return period
+    return None
+
+
+def window_criteria(column, window):
+    if window is None:
+        return ()
+    start, end = window
+    return column >= start, column < end
@@ -0,0 +1,415 @@
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# 🔎 REQUEST TRACING
+# Every HTTP request gets a trace id (returned as X-Trace-Id) and
+# timed spans for its stages: routing, SQL (one span per statement,
+# with the driver's row count), LLM queue and generation, tone,
+# chat save.
+# Finished traces go to a background exporter:
+#   jsonl -> one JSON object per trace in TRACE_JSONL_PATH, rotated
+#            at TRACE_JSONL_MAX_BYTES
+#   otlp  -> OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT (collector, Jaeger, Tempo)
+# =====================================================
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# "jsonl", "otlp" or "none" (ids and headers only)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "jsonl").lower()
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "./traces/traces.jsonl")
+# Rotate to traces.jsonl.1 .. .N past this size; disk use stays under (N + 1) x size
+TRACE_JSONL_MAX_BYTES = int(os.getenv("TRACE_JSONL_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_JSONL_BACKUPS = int(os.getenv("TRACE_JSONL_BACKUPS", "3"))
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "school-chatbot")
+
+# Export only traces at least this slow (failed requests are always exported)
+TRACE_MIN_MS = float(os.getenv("TRACE_MIN_MS", "1000"))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+# sqlite3 reports no row count for SELECTs. This counts them by
+# buffering each traced ORM SELECT result in memory (Result.freeze()),
+# so it is off by default.
+TRACE_SQL_ROWS = os.getenv("TRACE_SQL_ROWS", "false").lower() in ("1", "true", "yes")
+
+TRACE_QUEUE_SIZE = 1000
+TRACE_BATCH_SIZE = 50
+TRACE_STATEMENT_CHARS = 300
+
+TRACE_HEADER = "X-Trace-Id"
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_current_trace = ContextVar("trace", default=None)
+_current_span = ContextVar("span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attrs", "error")
+
+    def __init__(self, name, parent_id=None, attrs=None, start_ns=None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attrs = dict(attrs or {})
+        self.error = None
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+class Trace:
+    def __init__(self, trace_id, root):
+        self.trace_id = trace_id
+        self.root = root
+        self.spans = [root]
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "duration_ms": round(self.root.duration_ms, 3),
+            "spans": [s.to_dict() for s in self.spans],
+        }
+
+
+def current_trace_id():
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+def annotate(**attrs):
+    """Attach attributes (e.g. intent) to the request's root span."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.root.attrs.update(attrs)
+
+
+def mark_error(error):
+    """Flag the request as failed for an error the handler answered around."""
+    trace = _current_trace.get()
+    if trace is not None and trace.root.error is None:
+        trace.root.error = repr(error)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as a child of the current span; a no-op outside a trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    s = Span(name, parent.span_id if parent else None, attrs)
+    trace.spans.append(s)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = repr(e)
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+def record(name, start_ns, end_ns=None, **attrs):
+    """Add an already-finished span, for code that can't hold a `with` block open."""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    parent = _current_span.get()
+    s = Span(name, parent.span_id if parent else None, attrs, start_ns)
+    s.end_ns = end_ns or time.time_ns()
+    trace.spans.append(s)
+    return s
+
+
+# =====================================================
+# 🗄️ SQLALCHEMY HOOKS
+# =====================================================
+
+def instrument_engine(engine):
+    """One "sql" span per statement, with the row count where it is known."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        if _current_trace.get() is not None:
+            conn.info.setdefault("trace_started", []).append(time.time_ns())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("trace_started")
+        if not started:
+            return
+        rows = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None
+        record(
+            "sql", started.pop(),
+            statement=" ".join(statement.split())[:TRACE_STATEMENT_CHARS],
+            rows=rows,
+            executemany=executemany,
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("trace_started"):
+            record("sql", conn.info["trace_started"].pop(), error=str(context.original_exception))
+
+
+def instrument_sessions(session_class):
+    """Row counts for SELECTs, which the DBAPI (sqlite3) doesn't report (TRACE_SQL_ROWS)."""
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def _count_rows(state):
+        trace = _current_trace.get()
+        options = state.execution_options
+        if (
+            trace is None
+            or not state.is_select
+            or options.get("stream_results")
+            or options.get("yield_per")
+        ):
+            return None
+
+        before = len(trace.spans)
+        result = state.invoke_statement()
+
+        for s in reversed(trace.spans[before:]):
+            if s.name == "sql":
+                frozen = result.freeze()
+                s.attrs["rows"] = len(frozen.data)
+                return frozen()
+        return result
+
+
+# =====================================================
+# 🌐 ASGI MIDDLEWARE
+# =====================================================
+
+class TraceMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(TRACE_HEADER.lower().encode(), b"")
+        incoming = incoming.decode("latin-1").strip().lower()
+        trace_id = incoming if _TRACE_ID.match(incoming) else uuid.uuid4().hex
+
+        root = Span(f"{scope['method']} {scope['path']}")
+        trace = Trace(trace_id, root)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(root)
+        status = {"code": 500}
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (TRACE_HEADER.lower().encode(), trace_id.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_header)
+        except BaseException as e:
+            root.error = repr(e)
+            raise
+        finally:
+            root.end_ns = time.time_ns()
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                root.attrs["route"] = route.path
+            root.attrs["status"] = status["code"]
+            if status["code"] >= 500 and root.error is None:
+                root.error = f"HTTP {status['code']}"
+
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            exporter.offer(trace)
+
+
+# =====================================================
+# 📤 EXPORT
+# =====================================================
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(traces):
+    spans = []
+    for trace in traces:
+        for s in trace.spans:
+            otlp = {
+                "traceId": trace.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 2 if s is trace.root else 1,   # SERVER / INTERNAL
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                "attributes": [
+                    {"key": k, "value": _otlp_value(v)}
+                    for k, v in s.attrs.items() if v is not None
+                ],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            }
+            if s.parent_id:
+                otlp["parentSpanId"] = s.parent_id
+            spans.append(otlp)
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}
+            ]},
+            "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+class TraceExporter:
+    """Background thread so the event loop never waits on disk or the collector."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.exported = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._thread = None
+        self._client = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wanted(self, trace):
+        if trace.root.error:
+            return True
+        if trace.root.duration_ms < TRACE_MIN_MS:
+            return False
+        return TRACE_SAMPLE_RATE >= 1 or random.random() < TRACE_SAMPLE_RATE
+
+    def offer(self, trace):
+        if self.kind == "none" or not self.running or not self.wanted(trace):
+            return
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        if self.kind == "none" or self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        if not self.running:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < TRACE_BATCH_SIZE:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                self._export(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning("trace export failed: %s", e)
+
+    def _export(self, batch):
+        if self.kind == "otlp":
+            if self._client is None:
+                self._client = httpx.Client(timeout=5)
+            self._client.post(TRACE_OTLP_ENDPOINT, json=to_otlp(batch)).raise_for_status()
+            return
+
+        folder = os.path.dirname(TRACE_JSONL_PATH)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._rotate()
+        with open(TRACE_JSONL_PATH, "a", encoding="utf-8") as f:
+            for trace in batch:
+                f.write(json.dumps(trace.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+
+    @staticmethod
+    def _rotate():
+        try:
+            if os.path.getsize(TRACE_JSONL_PATH) < TRACE_JSONL_MAX_BYTES:
+                return
+        except FileNotFoundError:
+            return
+
+        if TRACE_JSONL_BACKUPS <= 0:
+            os.remove(TRACE_JSONL_PATH)
+            return
+        # traces.jsonl.N-1 -> .N, ..., traces.jsonl -> .1; the oldest is overwritten
+        for i in range(TRACE_JSONL_BACKUPS - 1, 0, -1):
+            older = f"{TRACE_JSONL_PATH}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{TRACE_JSONL_PATH}.{i + 1}")
+        os.replace(TRACE_JSONL_PATH, f"{TRACE_JSONL_PATH}.1")
+
+
+exporter = TraceExporter(TRACE_EXPORTER if TRACING_ENABLED else "none")
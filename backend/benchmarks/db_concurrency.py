@@ -0,0 +1,147 @@
+"""
+Concurrent read/write throughput on SQLite, old engine settings vs app.database.
+
+Reader threads build student snapshots (the chat read path) while writer
+threads mark attendance through the admin route, for a fixed time. Each
+mode runs on its own freshly seeded database file.
+
+    python -m benchmarks.db_concurrency --readers 8 --writers 2 --seconds 10
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+
+def make_legacy_engine(url):
+    # database.py before the engine factory: default pool, rollback journal
+    from sqlalchemy import create_engine
+    return create_engine(url, connect_args={"check_same_thread": False})
+
+
+def run_mode(engine, students, days, readers, writers, seconds):
+    from sqlalchemy.orm import sessionmaker
+    from app.models import Base
+    from app.services import build_student_snapshot
+    from app.admin_routes import add_or_update_attendance
+    from benchmarks.load_test import seed
+
+    Base.metadata.create_all(bind=engine)
+    seed(engine, students, days)
+    Session = sessionmaker(bind=engine)
+
+    start = date.today() - timedelta(days=days - 1)
+    deadline = time.perf_counter() + seconds
+    results = {"read": [], "write": []}
+    errors = {"read": 0, "write": 0}
+    lock = threading.Lock()
+
+    def reader():
+        samples, failed = [], 0
+        while time.perf_counter() < deadline:
+            db = Session()
+            t0 = time.perf_counter()
+            try:
+                build_student_snapshot(db, random.randint(1, students))
+                samples.append(time.perf_counter() - t0)
+            except Exception:
+                failed += 1
+            finally:
+                db.close()
+        with lock:
+            results["read"].extend(samples)
+            errors["read"] += failed
+
+    def writer():
+        samples, failed = [], 0
+        while time.perf_counter() < deadline:
+            db = Session()
+            day = start + timedelta(days=random.randrange(days))
+            t0 = time.perf_counter()
+            try:
+                add_or_update_attendance(
+                    random.randint(1, students), day.isoformat(),
+                    random.choice(["Present", "Absent"]), db
+                )
+                samples.append(time.perf_counter() - t0)
+            except Exception:
+                db.rollback()
+                failed += 1
+            finally:
+                db.close()
+        with lock:
+            results["write"].extend(samples)
+            errors["write"] += failed
+
+    threads = (
+        [threading.Thread(target=reader) for _ in range(readers)] +
+        [threading.Thread(target=writer) for _ in range(writers)]
+    )
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    summary = {}
+    for kind, samples in results.items():
+        samples.sort()
+        summary[kind] = {
+            "ops": len(samples),
+            "ops_per_s": round(len(samples) / seconds, 1),
+            "errors": errors[kind],
+            "p50_ms": round(statistics.median(samples) * 1000, 2) if samples else None,
+            "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 2) if samples else None,
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--mode", choices=["both", "legacy", "tuned"], default="both")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    random.seed(7)
+    workdir = tempfile.mkdtemp(prefix="db-concurrency-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'app.db')}"
+
+    from app.database import make_engine
+
+    factories = {"legacy": make_legacy_engine, "tuned": make_engine}
+    modes = list(factories) if args.mode == "both" else [args.mode]
+
+    report = {}
+    for name in modes:
+        url = f"sqlite:///{os.path.join(workdir, name + '.db')}"
+        print(f"{name}: {args.readers} readers, {args.writers} writers, {args.seconds}s ...")
+        report[name] = run_mode(
+            factories[name](url), args.students, args.days,
+            args.readers, args.writers, args.seconds
+        )
+
+    print(f"\n{'mode':8} {'kind':6} {'ops/s':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, summary in report.items():
+        for kind, s in summary.items():
+            print(
+                f"{name:8} {kind:6} {s['ops_per_s']:9.1f} {s['errors']:7} "
+                f"{s['p50_ms'] or 0:9.2f} {s['p95_ms'] or 0:9.2f}"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
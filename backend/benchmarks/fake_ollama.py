@@ -0,0 +1,144 @@
+"""
+Local stand-in for Ollama's /api/generate, for benchmarks.
+
+Answers with a fixed number of tokens, sleeping --token-latency seconds
+before each one, in both the streaming (NDJSON) and the blocking format.
+Models count as loaded once asked for and are listed by /api/ps; an empty
+prompt only loads the model, as in Ollama. /api/tags lists `models` as the
+installed ones. Set `status` (e.g. 503) to play
+a broken backend that answers every generation with that error.
+
+    python -m benchmarks.fake_ollama --port 11500 --token-latency 0.02
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllama:
+    def __init__(self, host="127.0.0.1", port=0, token_latency=0.02, tokens=40, status=200,
+                 models=("phi3:latest",)):
+        self.token_latency = token_latency
+        self.tokens = tokens
+        self.status = status
+        self.models = list(models)
+        self.requests = 0
+        self.loaded = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/generate"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-ollama", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, payload, status=200):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _chunk(self, payload):
+                line = (json.dumps(payload) + "\n").encode()
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path.startswith("/api/ps"):
+                    self._json({"models": [{"name": m, "model": m} for m in sorted(fake.loaded)]})
+                elif self.path.startswith("/api/tags"):
+                    self._json({"models": [{"name": m, "model": m} for m in fake.models]})
+                else:
+                    self._json({"models": []})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                fake.loaded.add(body.get("model") or "")
+
+                if not body.get("prompt"):
+                    self._json({"model": body.get("model"), "response": "", "done": True})
+                    return
+
+                fake._count()
+
+                if fake.status != 200:
+                    self._json({"error": "fake backend failure"}, fake.status)
+                    return
+
+                words = [f"word{i} " for i in range(fake.tokens)]
+
+                if not body.get("stream"):
+                    time.sleep(fake.token_latency * fake.tokens)
+                    self._json({
+                        "model": body.get("model"),
+                        "response": "".join(words).strip(),
+                        "done": True,
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                for word in words:
+                    time.sleep(fake.token_latency)
+                    self._chunk({"response": word, "done": False})
+
+                self._chunk({"response": "", "done": True})
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--tokens", type=int, default=40)
+    args = parser.parse_args()
+
+    server = FakeOllama(args.host, args.port, args.token_latency, args.tokens)
+    print(f"Fake Ollama on {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Hot-lookup timings before and after migration 2 (composite indexes).
+
+Seeds a throwaway SQLite database with the baseline schema (primary keys
+only), times the queries the chat endpoint issues, applies the index
+migration and times them again.
+
+    python -m benchmarks.index_benchmark --rows 1000000 --students 1000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+
+def seed(path, rows, students):
+    conn = sqlite3.connect(path)
+    days = rows // students
+    start = date(2020, 1, 1)
+
+    conn.executemany(
+        "INSERT INTO master (id, name) VALUES (?, ?)",
+        ((sid, f"Student {sid}") for sid in range(1, students + 1))
+    )
+
+    # Day-major order, like a register filled in every morning
+    conn.executemany(
+        "INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)",
+        (
+            (sid, (start + timedelta(days=d)).isoformat(),
+             "Present" if random.random() < 0.9 else "Absent")
+            for d in range(days)
+            for sid in range(1, students + 1)
+        )
+    )
+
+    conn.executemany(
+        "INSERT INTO academics (student_id, subject, score) VALUES (?, ?, ?)",
+        (
+            (sid, subject, random.randint(30, 100))
+            for sid in range(1, students + 1)
+            for subject in ("Math", "English", "Science", "History")
+        )
+    )
+
+    now = datetime(2025, 1, 1)
+    conn.executemany(
+        "INSERT INTO chat_history (student_id, role, user_message, bot_reply, timestamp) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (
+            (random.randint(1, students), "student", "my marks", "Academic Records:",
+             (now + timedelta(seconds=i)).isoformat(sep=" "))
+            for i in range(rows // 10)
+        )
+    )
+
+    conn.commit()
+    conn.close()
+    return days
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": round(statistics.mean(samples), 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+    }
+
+
+def run_queries(SessionLocal, students, days, repeat):
+    from sqlalchemy import desc
+    from app.models import Academics, ChatHistory
+    from app.services import fetch_attendance_by_date, fetch_attendance_summary
+    from app.stats import attendance_counts, rollup_counts
+
+    start = date(2020, 1, 1)
+    db = SessionLocal()
+
+    def rand_student():
+        return random.randint(1, students)
+
+    def rand_day():
+        return (start + timedelta(days=random.randrange(days))).isoformat()
+
+    try:
+        return {
+            "attendance_by_date": timed(
+                lambda: fetch_attendance_by_date(db, rand_student(), rand_day()),
+                repeat
+            ),
+            "attendance_month_summary": timed(
+                lambda: fetch_attendance_summary(db, rand_student(), 3, 2020),
+                repeat
+            ),
+            "attendance_counts_all_time": timed(
+                lambda: attendance_counts(db, rand_student()),
+                repeat
+            ),
+            "rollup_counts_all_time": timed(
+                lambda: rollup_counts(db, rand_student()),
+                repeat
+            ),
+            "academics_by_subject": timed(
+                lambda: db.query(Academics.score).filter(
+                    Academics.student_id == rand_student(),
+                    Academics.subject == "Math"
+                ).first(),
+                repeat
+            ),
+            "chat_history_latest_20": timed(
+                lambda: db.query(ChatHistory.id).filter(
+                    ChatHistory.student_id == rand_student()
+                ).order_by(desc(ChatHistory.timestamp)).limit(20).all(),
+                repeat
+            ),
+        }
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    random.seed(7)
+    workdir = tempfile.mkdtemp(prefix="index-bench-")
+    path = os.path.join(workdir, "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from app.database import engine, SessionLocal
+    from app import migrations, models, rollup
+
+    # Baseline schema: tables only, no secondary indexes
+    with engine.begin() as conn:
+        models.Base.metadata.create_all(bind=conn)
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name.startswith(("uq_", "ix_chat_history_student")):
+                    index.drop(bind=conn)
+
+    print(f"Seeding {args.rows:,} attendance rows for {args.students:,} students ...")
+    days = seed(path, args.rows, args.students)
+
+    with SessionLocal() as db:
+        rollup.rebuild(db)
+        db.commit()
+
+    before = run_queries(SessionLocal, args.students, days, args.repeat)
+
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        migrations._add_hot_indexes(conn)
+    index_build_s = round(time.perf_counter() - t0, 2)
+
+    after = run_queries(SessionLocal, args.students, days, args.repeat)
+
+    print(f"\nIndex build: {index_build_s}s\n")
+    print(f"{'query':30} {'before ms':>12} {'after ms':>12} {'speedup':>9}")
+    for name in before:
+        b, a = before[name]["mean_ms"], after[name]["mean_ms"]
+        print(f"{name:30} {b:12.3f} {a:12.3f} {b / a if a else 0:8.1f}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "rows": args.rows,
+                "students": args.students,
+                "index_build_s": index_build_s,
+                "before": before,
+                "after": after,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
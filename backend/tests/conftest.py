@@ -0,0 +1,22 @@
+import os
+
+# One shared in-memory SQLite database (StaticPool) unless a URL is given;
+# must be set before app.database builds its engine
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("TRACING_ENABLED", "false")
+
+import pytest  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.models import Base  # noqa: E402  (importing models registers the tables)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
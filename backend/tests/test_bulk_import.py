@@ -0,0 +1,52 @@
+from datetime import date
+
+from app.bulk_import import import_attendance, import_marks
+from app.models import Academics, Attendance, Master
+
+# =====================================================
+# 📥 BULK IMPORT
+# =====================================================
+
+
+def add_students(db, *ids):
+    db.add_all([Master(id=i, name=f"student {i}") for i in ids])
+    db.commit()
+
+
+def test_repeated_attendance_key_keeps_last_and_reports_the_rest(db):
+    add_students(db, 1)
+    rows = [
+        {"student_id": 1, "date": "2025-01-02", "status": "Present"},
+        {"student_id": 1, "date": "2025-01-02", "status": "Absent"},
+        {"student_id": 1, "date": "2025-01-02", "status": "Present"},
+        {"student_id": 1, "date": "2025-01-02", "status": "Absent"},
+    ]
+
+    result, student_ids = import_attendance(db, rows)
+
+    assert result["received"] == 4 and result["written"] == 1
+    assert result["errors"] == [
+        {"row": 1, "error": "duplicate of row 4"},
+        {"row": 2, "error": "duplicate of row 4"},
+        {"row": 3, "error": "duplicate of row 4"},
+    ]
+    assert student_ids == {1}
+    assert db.query(Attendance.status).filter(Attendance.date == date(2025, 1, 2)).scalar() == "Absent"
+
+
+def test_every_row_is_written_or_reported(db):
+    add_students(db, 1, 2)
+    rows = [
+        {"student_id": 1, "subject": "Math", "score": 40},
+        {"student_id": 1, "subject": "math", "score": 70},
+        {"student_id": 2, "subject": "English", "score": 55},
+        {"student_id": 9, "subject": "English", "score": 10},
+        {"student_id": 2, "subject": "Science"},
+    ]
+
+    result, _ = import_marks(db, rows)
+
+    assert result["received"] == result["written"] + len(result["errors"])
+    assert [e["row"] for e in result["errors"]] == [1, 4, 5]
+    assert result["errors"][0]["error"] == "duplicate of row 2"
+    assert db.query(Academics.score).filter(Academics.student_id == 1).scalar() == 70
@@ -0,0 +1,84 @@
+import asyncio
+import socket
+
+import pytest
+
+from app import llm
+from app.llm_lifecycle import ModelHealth
+from benchmarks.fake_ollama import FakeOllama
+
+# =====================================================
+# 🔋 LLM LIFECYCLE / READINESS
+# =====================================================
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeOllama(token_latency=0, tokens=1, models=[f"{llm.OLLAMA_MODEL}:latest"]).start()
+    monkeypatch.setattr(llm, "pool", llm.BackendPool([fake.url]))
+    yield fake
+    fake.stop()
+
+
+def check(health, warm=False):
+    async def main():
+        try:
+            backend = llm.pool.backends[0]
+            await health.check_backend(backend, warm)
+            return health.host(backend)
+        finally:
+            await llm.pool.close()
+    return asyncio.run(main())
+
+
+def test_ready_while_the_idle_model_is_unloaded(fake):
+    health = ModelHealth()
+
+    host = check(health)
+
+    assert host.installed and not host.loaded
+    # No traffic means no warm-up, and that must not keep the pod unready
+    assert health.ready
+    assert health.state()["loaded"] is False
+
+
+def test_not_ready_when_the_model_is_not_installed(fake):
+    fake.models = ["other-model:latest"]
+    health = ModelHealth()
+
+    host = check(health)
+
+    assert host.reachable and not host.installed
+    assert not health.ready
+    assert "not installed" in host.last_error
+
+
+def test_failed_load_unready_until_a_later_load_works(fake, monkeypatch):
+    health = ModelHealth()
+    warm = health.warm
+
+    async def broken_warm(backend, host):
+        raise RuntimeError("out of memory")
+
+    monkeypatch.setattr(health, "warm", broken_warm)
+    host = check(health, warm=True)
+    assert host.load_failed and not health.ready
+
+    # Retried without any traffic, since nothing else would retry it
+    monkeypatch.setattr(health, "warm", warm)
+    host = check(health, warm=False)
+    assert host.loaded and not host.load_failed
+    assert health.ready
+
+
+def test_unreachable_backend_is_not_ready(monkeypatch):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    monkeypatch.setattr(llm, "pool", llm.BackendPool([f"http://127.0.0.1:{port}"]))
+    health = ModelHealth()
+
+    host = check(health)
+
+    assert not host.reachable and not health.ready
+    assert llm.pool.backends[0].ejected()
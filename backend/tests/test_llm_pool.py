@@ -0,0 +1,186 @@
+import asyncio
+import socket
+
+import pytest
+
+from app import llm
+from benchmarks.fake_ollama import FakeOllama
+
+# =====================================================
+# 🖧 LLM BACKEND POOL
+# Against local fake Ollama servers (benchmarks.fake_ollama).
+# =====================================================
+
+
+def closed_port_url():
+    """A URL nothing listens on, so connecting fails with ConnectError."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/api/generate"
+
+
+@pytest.fixture(autouse=True)
+def least_outstanding(monkeypatch):
+    # Deterministic picks: unmeasured backends all score 0 under "latency"
+    monkeypatch.setattr(llm, "OLLAMA_BALANCE", "least_outstanding")
+
+
+@pytest.fixture
+def fakes():
+    started = []
+
+    def start(**kwargs):
+        kwargs.setdefault("token_latency", 0)
+        fake = FakeOllama(tokens=3, **kwargs).start()
+        started.append(fake)
+        return fake
+
+    yield start
+    for fake in started:
+        fake.stop()
+
+
+@pytest.fixture
+def use_pool(monkeypatch):
+    def use(*urls):
+        pool = llm.BackendPool(urls)
+        monkeypatch.setattr(llm, "pool", pool)
+        return pool
+    return use
+
+
+def run(scenario):
+    """Run a test body in one event loop; the pool's clients belong to it."""
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await llm.pool.close()
+    return asyncio.run(main())
+
+
+async def collect(tokens):
+    return "".join([token async for token in tokens])
+
+
+# ---------------- BALANCING ----------------
+def test_pick_least_outstanding():
+    pool = llm.BackendPool(["http://a:1", "http://b:1", "http://c:1"])
+    a, b, c = pool.backends
+    a.outstanding, b.outstanding, c.outstanding = 3, 1, 2
+
+    assert pool.pick() is b
+    assert pool.pick(exclude=[b]) is c
+    assert pool.pick(exclude=[a, b, c]) is None
+
+
+def test_pick_skips_ejected_backends():
+    pool = llm.BackendPool(["http://a:1", "http://b:1"])
+    a, b = pool.backends
+    a.outstanding, b.outstanding = 0, 5
+
+    a.eject(30)
+    assert pool.pick() is b
+
+    # Everything ejected: the one that comes back soonest
+    b.eject(60)
+    assert pool.pick() is a
+
+
+def test_requests_spread_across_backends(fakes, use_pool):
+    first, second = fakes(token_latency=0.02), fakes(token_latency=0.02)
+    use_pool(first.url, second.url)
+
+    async def burst():
+        return await asyncio.gather(*[llm.call_llm("hi", "student") for _ in range(8)])
+
+    replies = run(burst)
+
+    assert all(reply.startswith("word0") for reply in replies)
+    # Each new request goes to the backend with fewer in flight
+    assert first.requests == second.requests == 4
+
+
+# ---------------- EJECTION ----------------
+def test_backend_ejected_after_failures_and_readmitted(fakes, use_pool, monkeypatch):
+    broken = fakes(status=500)
+    pool = use_pool(broken.url)
+    backend = pool.backends[0]
+
+    async def scenario():
+        for _ in range(llm.OLLAMA_EJECT_AFTER):
+            assert await llm.call_llm("hi", "student") == llm.UNAVAILABLE_REPLY
+
+        assert backend.ejected()
+        assert backend.failures == llm.OLLAMA_EJECT_AFTER
+
+        # Once the ejection window passes it is picked again...
+        later = llm.time.monotonic() + llm.OLLAMA_EJECT_SECONDS + 1
+        monkeypatch.setattr(llm.time, "monotonic", lambda: later)
+        assert not backend.ejected()
+        assert pool.pick() is backend
+
+        # ...and one good answer clears its failure streak
+        broken.status = 200
+        assert (await llm.call_llm("hi", "student")).startswith("word0")
+        assert backend.failures == 0
+
+    run(scenario)
+
+
+# ---------------- RETRIES ----------------
+@pytest.mark.parametrize("status", [502, 503])
+def test_call_retries_on_another_backend_after_bad_gateway(fakes, use_pool, status):
+    broken, healthy = fakes(status=status), fakes()
+    pool = use_pool(broken.url, healthy.url)
+    # Make the broken backend the first pick
+    pool.backends[1].outstanding = 1
+
+    reply = run(lambda: llm.call_llm("hi", "student"))
+
+    assert reply.startswith("word0")
+    assert broken.requests == 1 and healthy.requests == 1
+    assert pool.backends[0].failures == 1
+
+
+def test_call_retries_after_connect_error(fakes, use_pool):
+    healthy = fakes()
+    pool = use_pool(closed_port_url(), healthy.url)
+    pool.backends[1].outstanding = 1
+
+    reply = run(lambda: llm.call_llm("hi", "student"))
+
+    assert reply.startswith("word0")
+    assert pool.backends[0].failures == 1
+    assert healthy.requests == 1
+
+
+@pytest.mark.parametrize("status", [502, 503])
+def test_stream_retries_on_another_backend_after_bad_gateway(fakes, use_pool, status):
+    broken, healthy = fakes(status=status), fakes()
+    pool = use_pool(broken.url, healthy.url)
+    pool.backends[1].outstanding = 1
+
+    reply = run(lambda: collect(llm.stream_llm("hi", "student")))
+
+    assert reply == "word0 word1 word2 "
+    assert broken.requests == 1 and healthy.requests == 1
+
+
+def test_stream_retries_after_connect_error(fakes, use_pool):
+    healthy = fakes()
+    pool = use_pool(closed_port_url(), healthy.url)
+    pool.backends[1].outstanding = 1
+
+    reply = run(lambda: collect(llm.stream_llm("hi", "student")))
+
+    assert reply == "word0 word1 word2 "
+    assert pool.backends[0].failures == 1
+
+
+def test_unavailable_when_every_backend_fails(fakes, use_pool):
+    use_pool(closed_port_url(), fakes(status=503).url)
+
+    assert run(lambda: llm.call_llm("hi", "student")) == llm.UNAVAILABLE_REPLY
+    assert run(lambda: collect(llm.stream_llm("hi", "student"))) == llm.UNAVAILABLE_REPLY
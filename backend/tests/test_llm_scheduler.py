@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from app import llm_scheduler
+from app.llm_scheduler import LLMScheduler, Overloaded
+
+# =====================================================
+# 🚦 LLM SCHEDULER
+# =====================================================
+
+
+def test_evicted_as_the_wait_times_out_is_shed(monkeypatch):
+    scheduler = LLMScheduler(max_in_flight=1, max_queue=1, queue_timeout=1)
+    scheduler.in_flight = 1
+
+    async def evicted_then_timed_out(awaitable, timeout):
+        # _make_room evicts the waiter in the same tick its timeout fires
+        awaitable.cancel()        # as wait_for does with the shield on timeout
+        _, _, future = scheduler._waiting[0]
+        future.set_exception(Overloaded())
+        raise asyncio.TimeoutError
+
+    monkeypatch.setattr(llm_scheduler.asyncio, "wait_for", evicted_then_timed_out)
+
+    with pytest.raises(Overloaded):
+        asyncio.run(scheduler._acquire(None, (3, 0)))
+    assert scheduler.in_flight == 1
+    assert scheduler._stats[None].shed == 1
+
+
+def test_slot_granted_as_the_wait_times_out_is_kept(monkeypatch):
+    scheduler = LLMScheduler(max_in_flight=1, max_queue=1, queue_timeout=1)
+    scheduler.in_flight = 1
+
+    async def granted_then_timed_out(awaitable, timeout):
+        scheduler._release()      # hands the slot straight to the waiter
+        raise asyncio.TimeoutError
+
+    monkeypatch.setattr(llm_scheduler.asyncio, "wait_for", granted_then_timed_out)
+
+    asyncio.run(scheduler._acquire(None, (3, 0)))
+    assert scheduler.in_flight == 1
+    assert scheduler._stats[None].shed == 0
+
+
+def test_shed_when_the_queue_is_full():
+    scheduler = LLMScheduler(max_in_flight=1, max_queue=1, queue_timeout=5)
+
+    async def scenario():
+        async with scheduler.slot(None, "first"):
+            waiting = asyncio.create_task(scheduler._acquire(None, (3, 0)))
+            await asyncio.sleep(0)
+            with pytest.raises(Overloaded):
+                await scheduler._acquire(None, (3, 0))
+        await waiting
+        scheduler._release()
+
+    asyncio.run(scenario())
+    assert scheduler.in_flight == 0
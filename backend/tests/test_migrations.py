@@ -0,0 +1,59 @@
+import logging
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app import migrations
+
+# =====================================================
+# 🗂️ MIGRATIONS
+# =====================================================
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    """A database at version 1 with two duplicate attendance rows for one key."""
+    bind = create_engine(f"sqlite:///{tmp_path / 'school.db'}")
+    with bind.begin() as conn:
+        migrations.current_version(conn)
+        migrations._create_tables(conn)
+        conn.execute(migrations.schema_version.insert().values(
+            version=1, description="baseline tables", applied_at=migrations.datetime.utcnow()
+        ))
+        conn.execute(text("INSERT INTO master VALUES (1, 'a')"))
+        conn.execute(text(
+            "INSERT INTO attendance (id, student_id, date, status) VALUES "
+            "(1, 1, '2025-01-02', 'Present'), (2, 1, '2025-01-02', 'Absent'), "
+            "(3, 1, '2025-01-02', 'Present'), (4, 1, '2025-01-03', 'Present')"
+        ))
+    yield bind
+    bind.dispose()
+
+
+def version(bind):
+    with bind.connect() as conn:
+        return migrations.current_version(conn)
+
+
+def test_duplicates_stop_the_migration(baseline, monkeypatch):
+    monkeypatch.setattr(migrations, "MIGRATION_DEDUPE", False)
+
+    with pytest.raises(RuntimeError, match=r"2 duplicate rows .*\(1, '2025-01-02'\)"):
+        migrations.run_migrations(baseline)
+
+    assert version(baseline) == 1
+    with baseline.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM attendance")).scalar() == 4
+
+
+def test_dedupe_keeps_the_newest_row_and_logs_it(baseline, monkeypatch, caplog):
+    monkeypatch.setattr(migrations, "MIGRATION_DEDUPE", True)
+
+    with caplog.at_level(logging.WARNING, logger="app.migrations"):
+        migrations.run_migrations(baseline)
+
+    assert version(baseline) == migrations.MIGRATIONS[-1][0]
+    with baseline.connect() as conn:
+        assert conn.execute(text("SELECT id FROM attendance ORDER BY id")).scalars().all() == [3, 4]
+    assert "deleted 2 duplicate attendance rows" in caplog.text
+    assert "(1, '2025-01-02')" in caplog.text
@@ -0,0 +1,104 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app import rate_limit, schemas
+from app.rate_limit import MemoryBuckets, SQLiteBuckets, chat_rate_limit
+
+# =====================================================
+# ⏱️ RATE LIMITING
+# =====================================================
+
+SQL_MESSAGE = "what is my attendance"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def buckets(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteBuckets(str(tmp_path / "rate_limit.db"))
+    return MemoryBuckets()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(rate_limit, "buckets", MemoryBuckets())
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_FORWARDED", True)
+    monkeypatch.setitem(rate_limit.BUDGETS, "sql", (0, 3))
+    monkeypatch.setitem(rate_limit.IP_BUDGETS, "sql", (0, 5))
+
+    app = FastAPI()
+
+    @app.post("/chat", dependencies=[Depends(chat_rate_limit)])
+    def chat(request: schemas.ChatRequest):
+        return {"reply": "ok"}
+
+    return TestClient(app)
+
+
+def send(client, student_id=None, ip="10.0.0.1"):
+    body = {"message": SQL_MESSAGE, "role": "student", "student_id": student_id}
+    return client.post("/chat", json=body, headers={"X-Forwarded-For": ip}).status_code
+
+
+# ---------------- BUCKETS ----------------
+def test_take_spends_until_the_burst_is_gone(buckets):
+    for _ in range(3):
+        assert buckets.take([("a", 1, 3)]) == 0
+    assert buckets.take([("a", 1, 3)]) == pytest.approx(1, abs=0.1)
+
+
+def test_take_spends_from_every_bucket_or_none(buckets):
+    assert buckets.take([("a", 1, 1)]) == 0
+
+    # "a" is empty, so "b" must keep its token
+    assert buckets.take([("a", 1, 1), ("b", 1, 1)]) > 0
+    assert buckets.take([("b", 1, 1)]) == 0
+
+
+def test_take_waits_for_the_slowest_bucket(buckets):
+    buckets.take([("fast", 10, 1), ("slow", 0.1, 1)])
+
+    assert buckets.take([("fast", 10, 1), ("slow", 0.1, 1)]) == pytest.approx(10, abs=0.5)
+
+
+def test_zero_rate_asks_for_an_hour(buckets):
+    buckets.take([("a", 0, 1)])
+
+    assert buckets.take([("a", 0, 1)]) == 3600
+
+
+# ---------------- DEPENDENCY ----------------
+def test_student_limited_to_its_own_budget(client):
+    assert [send(client, student_id=1) for _ in range(4)] == [200, 200, 200, 429]
+    # Another student behind the same address still gets through
+    assert send(client, student_id=2) == 200
+
+
+def test_changing_student_id_does_not_dodge_the_ip_limit(client):
+    codes = [send(client, student_id=n) for n in range(6)]
+
+    assert codes == [200] * 5 + [429]
+    assert send(client, student_id=99, ip="10.0.0.2") == 200
+
+
+def test_anonymous_requests_limited_per_ip(client):
+    assert [send(client) for _ in range(4)] == [200, 200, 200, 429]
+    assert send(client, ip="10.0.0.2") == 200
+
+
+def test_429_carries_retry_after(client, monkeypatch):
+    monkeypatch.setitem(rate_limit.BUDGETS, "sql", (1 / 60, 1))
+    send(client, student_id=1)
+
+    response = client.post(
+        "/chat", json={"message": SQL_MESSAGE, "role": "student", "student_id": 1}
+    )
+    assert response.status_code == 429
+    assert 55 <= int(response.headers["Retry-After"]) <= 60
+
+
+def test_disabled_limiter_lets_everything_through(client, monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+
+    assert all(send(client, student_id=1) == 200 for _ in range(10))
@@ -0,0 +1,134 @@
+import random
+from datetime import date, timedelta
+
+from app import rollup
+from app.bulk_import import import_attendance
+from app.models import Attendance, AttendanceRollup, Master
+
+# =====================================================
+# 📆 ATTENDANCE ROLLUP
+# Writes go through the same rollup calls as the admin routes.
+# =====================================================
+
+
+def add_students(db, *ids):
+    db.add_all([Master(id=i, name=f"student {i}") for i in ids])
+    db.commit()
+
+
+def mark(db, student_id, day, status):
+    """As POST /admin/attendance: add the day or change its status."""
+    record = db.query(Attendance).filter(
+        Attendance.student_id == student_id, Attendance.date == day
+    ).first()
+    if record:
+        rollup.record_attendance(db, student_id, day, record.status, status)
+        record.status = status
+    else:
+        db.add(Attendance(student_id=student_id, date=day, status=status))
+        rollup.record_attendance(db, student_id, day, None, status)
+    db.commit()
+
+
+def delete_student(db, student_id):
+    """As DELETE /admin/students/{id}."""
+    db.query(Attendance).filter(Attendance.student_id == student_id).delete()
+    rollup.forget_student(db, student_id)
+    db.query(Master).filter(Master.id == student_id).delete()
+    db.commit()
+
+
+def months(db):
+    return {
+        (r.student_id, r.year, r.month): (r.present, r.absent, r.total)
+        for r in db.query(AttendanceRollup)
+    }
+
+
+# ---------------- INCREMENTAL ----------------
+def test_record_attendance_adds_and_changes_days(db):
+    add_students(db, 1)
+    mark(db, 1, date(2025, 1, 2), "Present")
+    mark(db, 1, date(2025, 1, 3), "Absent")
+    mark(db, 1, date(2025, 2, 3), "Present")
+    mark(db, 1, date(2025, 1, 3), "Present")
+
+    assert months(db) == {(1, 2025, 1): (2, 0, 2), (1, 2025, 2): (1, 0, 1)}
+    assert rollup.mismatches(db) == []
+
+
+def test_record_bulk_counts_new_and_replaced_days(db):
+    add_students(db, 1, 2)
+    mark(db, 1, date(2025, 3, 1), "Absent")
+
+    result, _ = import_attendance(db, [
+        {"student_id": 1, "date": "2025-03-01", "status": "Present"},
+        {"student_id": 1, "date": "2025-03-02", "status": "Absent"},
+        {"student_id": 2, "date": "2025-04-30", "status": "Present"},
+    ])
+
+    assert result["written"] == 3
+    assert months(db) == {(1, 2025, 3): (1, 1, 2), (2, 2025, 4): (1, 0, 1)}
+    assert rollup.mismatches(db) == []
+
+
+def test_forget_student_drops_its_months(db):
+    add_students(db, 1, 2)
+    mark(db, 1, date(2025, 1, 2), "Present")
+    mark(db, 2, date(2025, 1, 2), "Absent")
+
+    delete_student(db, 1)
+
+    assert months(db) == {(2, 2025, 1): (0, 1, 1)}
+    assert rollup.mismatches(db) == []
+
+
+# ---------------- CHECK ----------------
+def test_mismatches_reports_missing_extra_and_wrong_months(db):
+    add_students(db, 1, 2)
+    for day, status in [(date(2025, 1, 2), "Present"), (date(2025, 2, 2), "Absent")]:
+        mark(db, 1, day, status)
+    mark(db, 2, date(2025, 1, 2), "Present")
+
+    # Missing from the rollup, only in the rollup, and disagreeing on absent
+    db.query(AttendanceRollup).filter(AttendanceRollup.month == 2).delete()
+    db.add(AttendanceRollup(student_id=2, year=2024, month=12, present=1, absent=0, total=1))
+    db.query(AttendanceRollup).filter(AttendanceRollup.student_id == 2, AttendanceRollup.month == 1) \
+        .update({"present": 0, "absent": 1})
+    db.commit()
+
+    assert rollup.mismatches(db) == [(1, 2025, 2), (2, 2024, 12), (2, 2025, 1)]
+
+    rollup.rebuild(db)
+    db.commit()
+    assert rollup.mismatches(db) == []
+
+
+def test_random_writes_stay_in_step_with_a_rebuild(db):
+    rng = random.Random(19)
+    students = list(range(1, 6))
+    add_students(db, *students)
+    days = [date(2024, 11, 25) + timedelta(days=n) for n in range(70)]
+
+    for _ in range(300):
+        action = rng.random()
+        if action < 0.6:
+            mark(db, rng.choice(students), rng.choice(days), rng.choice(["Present", "Absent"]))
+        elif action < 0.95:
+            import_attendance(db, [
+                {
+                    "student_id": rng.choice(students),
+                    "date": rng.choice(days).isoformat(),
+                    "status": rng.choice(["Present", "Absent", " present "]),
+                }
+                for _ in range(rng.randint(1, 8))
+            ])
+        elif len(students) > 2:
+            gone = students.pop(rng.randrange(len(students)))
+            delete_student(db, gone)
+
+    assert rollup.mismatches(db) == []
+    kept = months(db)
+    rollup.rebuild(db)
+    db.commit()
+    assert months(db) == kept
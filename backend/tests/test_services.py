@@ -0,0 +1,45 @@
+from app import services
+from app.models import Academics, Master
+
+# =====================================================
+# 🗃️ STUDENT SNAPSHOT
+# =====================================================
+
+
+def add_student(db, student_id, score):
+    db.add(Master(id=student_id, name=f"student {student_id}"))
+    db.add(Academics(student_id=student_id, subject="Math", score=score))
+    db.commit()
+
+
+def test_snapshot_cached_until_invalidated(db):
+    add_student(db, 1, 50)
+    assert services.get_student_snapshot(db, 1)["marks"][0]["score"] == 50
+
+    db.query(Academics).update({"score": 90})
+    db.commit()
+    assert services.get_student_snapshot(db, 1)["marks"][0]["score"] == 50
+
+    services.invalidate_student(1)
+    assert services.get_student_snapshot(db, 1)["marks"][0]["score"] == 90
+    services.invalidate_student(1)
+
+
+def test_build_racing_an_invalidation_is_not_stored(db, monkeypatch):
+    add_student(db, 2, 50)
+    build = services.build_student_snapshot
+
+    def build_then_admin_write(session, student_id):
+        snapshot = build(session, student_id)
+        # The admin commit and its invalidation land while the build finishes
+        db.query(Academics).update({"score": 90})
+        db.commit()
+        services.invalidate_student(student_id)
+        return snapshot
+
+    monkeypatch.setattr(services, "build_student_snapshot", build_then_admin_write)
+    assert services.get_student_snapshot(db, 2)["marks"][0]["score"] == 50
+
+    monkeypatch.setattr(services, "build_student_snapshot", build)
+    assert services.get_student_snapshot(db, 2)["marks"][0]["score"] == 90
+    services.invalidate_student(2)